@@ -0,0 +1,102 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache import bump_version, get_cache, get_version, is_shared
+
+TOKEN_NAMESPACE = 'tokens'
+
+
+class LRUCache:
+    """A bounded in-process cache whose entries also expire after ttl."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_tokens = LRUCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+
+
+def invalidate_tokens():
+    """Drop every cached token once the current transaction commits.
+
+    Tokens are only invalidated on logout and on user changes, which are
+    rare enough that one version for all of them is simpler than tracking
+    the entries of each user in every process.
+    """
+    transaction.on_commit(lambda: bump_version(TOKEN_NAMESPACE))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that skips the Token + user query when cached.
+
+    Users are kept per token in the process for TOKEN_CACHE_TTL seconds
+    and, with TOKEN_CACHE_SHARED, in the API cache too. Each entry carries
+    the tokens version, so a logout or a user change invalidates it in
+    every worker on its next request. That version lives in the API
+    cache, so with a per-process backend such as the default LocMemCache
+    nothing is cached and every request reads the token from the database.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_shared():
+            return super().authenticate_credentials(key)
+        version = get_version(TOKEN_NAMESPACE)
+        cache_key = (
+            f'{TOKEN_NAMESPACE}:{version}:'
+            f'{hashlib.sha256(key.encode()).hexdigest()}'
+        )
+        user = local_tokens.get(cache_key)
+        if user is None and settings.TOKEN_CACHE_SHARED:
+            user = get_cache().get(cache_key)
+            if user is not None:
+                local_tokens.set(cache_key, user)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            local_tokens.set(cache_key, copy.copy(user))
+            if settings.TOKEN_CACHE_SHARED:
+                get_cache().set(
+                    cache_key, user, timeout=settings.TOKEN_CACHE_TTL
+                )
+            return user, token
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        # Requests must not share one mutable user instance.
+        user = copy.copy(user)
+        return user, self.get_model()(key=key, user=user)
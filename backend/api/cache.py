@@ -0,0 +1,271 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+
+# Each process has its own copy of these, so a bump reaches no other one.
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def is_shared():
+    """Whether all workers and management commands see one API cache."""
+    backend = settings.CACHES[settings.API_CACHE_ALIAS]['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS
+
+
+def get_version(namespace):
+    """Current generation of a namespace; cached entries embed it in keys."""
+    cache = get_cache()
+    key = f'{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        # A fresh value, so entries left from an evicted counter never match.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    cache = get_cache()
+    try:
+        cache.incr(f'{namespace}:version')
+    except ValueError:
+        get_version(namespace)
+
+
+def bump_version_on_commit(namespace):
+    """Bump after commit, so no one caches data the rollback would undo."""
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+# Left by the winner of single_flight when its result is not cacheable.
+NOT_CACHED = 'single_flight:not-cached'
+
+
+def wait_for(cache, key, lock):
+    """The winner's value, or None once there will be none to wait for."""
+    deadline = time.monotonic() + settings.API_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.API_CACHE_LOCK_POLL)
+        found = cache.get_many((key, lock))
+        value = found.get(key)
+        if value is not None:
+            return None if value == NOT_CACHED else value
+        if lock not in found:
+            # The winner failed, or the cache was cleared meanwhile.
+            return None
+    return None
+
+
+def single_flight(key, compute, timeout):
+    """Get key from the cache, letting only one caller compute a miss.
+
+    The others wait for the winner's value instead of stampeding the
+    database. A None result is not cached: the winner leaves a short-lived
+    marker instead, and the waiters compute their own result at once, as
+    they do when the value does not show up in time.
+    """
+    cache = get_cache()
+    value = cache.get(key)
+    if value == NOT_CACHED:
+        return compute()
+    if value is not None:
+        return value
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, timeout=settings.API_CACHE_LOCK_TIMEOUT):
+        value = wait_for(cache, key, lock)
+        return compute() if value is None else value
+    try:
+        value = compute()
+        if value is None:
+            cache.set(key, NOT_CACHED, timeout=settings.API_CACHE_LOCK_TIMEOUT)
+        else:
+            cache.set(key, value, timeout=timeout)
+        return value
+    finally:
+        cache.delete(lock)
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    return etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+
+class CachedListMixin:
+    """Serve an unfiltered list as pre-rendered JSON from the cache.
+
+    The cache key carries the namespace version, which model signals bump
+    on every change, so stale entries are simply never read again. Bumps
+    made in another process miss a per-process cache, where entries only
+    expire after API_CACHE_TIMEOUT.
+    """
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        version = get_version(self.cache_namespace)
+        key = f'{self.cache_namespace}:list:{version}'
+        cache = get_cache()
+        cached = cache.get(key)
+        if cached is None:
+            serializer = self.get_serializer(self.get_queryset(), many=True)
+            content = JSONRenderer().render(serializer.data)
+            cached = (content, make_etag(key, content))
+            cache.set(key, cached, timeout=settings.API_CACHE_TIMEOUT)
+        content, etag = cached
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        return response
+
+
+class SharedCacheMixin:
+    """Serve list and retrieve from serialized data shared by all users.
+
+    The data is cached, not the rendered bytes, and personalize() then
+    overlays the requesting user's state on a copy of it. Keys hold the
+    namespace version, the host, the object id and the query parameters
+    named in cache_query_params, sorted, so equivalent URLs share an
+    entry. Requests by users with personal_query_params, whose results
+    differ per user, bypass the cache.
+    """
+    cache_namespace = None
+    cache_query_params = ()
+    personal_query_params = ()
+    last_modified_field = 'updated_at'
+
+    def personalize(self, request, data):
+        """Apply per-user fields to data; return a tag of that state."""
+        return ''
+
+    def is_cacheable(self, request):
+        if request.accepted_renderer.format != 'json':
+            return False
+        return not request.user.is_authenticated or not any(
+            name in request.query_params
+            for name in self.personal_query_params
+        )
+
+    def cache_key(self, request):
+        params = sorted(
+            (name, sorted(value for value in values if value))
+            for name, values in request.query_params.lists()
+            if name in self.cache_query_params
+        )
+        return make_etag(
+            request.scheme, request.get_host(), self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            params,
+        ).strip('"')
+
+    def track_modified(self, objects):
+        modified = [
+            getattr(obj, self.last_modified_field) for obj in objects
+        ]
+        if modified:
+            self.last_modified = max(
+                [*modified, getattr(self, 'last_modified', modified[0])]
+            )
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        self.track_modified(page or ())
+        return page
+
+    def get_object(self):
+        instance = super().get_object()
+        self.track_modified([instance])
+        return instance
+
+    def cached_data(self, request, handler, *args, **kwargs):
+        """Return the cache key and (data, last modified timestamp).
+
+        A response other than 200 is not cached and is returned instead.
+        """
+        fresh = []
+
+        def compute():
+            response = handler(request, *args, **kwargs)
+            fresh.append(response)
+            if response.status_code != 200:
+                return None
+            modified = getattr(self, 'last_modified', None)
+            return (
+                response.data,
+                int(modified.timestamp()) if modified else None,
+            )
+
+        version = get_version(self.cache_namespace)
+        key = f'{self.cache_namespace}:{version}:{self.cache_key(request)}'
+        cached = single_flight(
+            key, compute, settings.API_CACHE_RESPONSE_TIMEOUT
+        )
+        return key, cached if cached is not None else fresh[0]
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        if 'HTTP_IF_NONE_MATCH' in request.META:
+            return etag_matches(request, etag)
+        since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        return bool(since and last_modified and last_modified <= since)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        key, cached = self.cached_data(request, handler, *args, **kwargs)
+        if isinstance(cached, Response):
+            return cached
+        data, last_modified = cached
+        etag = make_etag(key, self.personalize(request, data))
+        if request.user.is_authenticated:
+            # Last-Modified does not cover the user's favorites and cart.
+            last_modified = None
+        if self.not_modified(request, etag, last_modified):
+            response = Response(status=304)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(
+                response, public=True, max_age=settings.API_CACHE_MAX_AGE
+            )
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
@@ -0,0 +1,125 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from api.cache import get_version, single_flight
+from recipes.images import clean_upload
+from recipes.storage import media_storage
+
+
+def known_ids(queryset, namespace):
+    """Sorted ids of all queryset rows, cached per namespace version."""
+    return single_flight(
+        f'{namespace}:ids:{get_version(namespace)}',
+        lambda: array('q', queryset.order_by('pk').values_list(
+            'pk', flat=True
+        )),
+        settings.API_CACHE_TIMEOUT,
+    )
+
+
+def contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized recipe photos, null while they are rendered."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('source', 'variants')
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        if not variants:
+            return None
+        request = self.context.get('request')
+        return {
+            variant: {
+                extension: self.build_url(request, name)
+                for extension, name in formats.items()
+            }
+            for variant, formats in variants.items()
+        }
+
+    @staticmethod
+    def build_url(request, name):
+        url = media_storage.url(name)
+        if request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
+class CleanImageField(Base64ImageField):
+    """Base64ImageField storing the photo re-encoded without metadata.
+
+    The decoded image is kept on the file as decoded, and the variants
+    are rendered from it instead of from a second decode.
+    """
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        try:
+            image, extension, content = clean_upload(upload.read())
+        except (OSError, ValueError):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        cleaned = SimpleUploadedFile(
+            f'{self.get_file_name(content)}.{extension}', content
+        )
+        cleaned.decoded = image
+        return cleaned
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """A list of ids of queryset rows, or of objects holding them in key.
+
+    All ids are checked at once, against the cached id set of
+    id_namespace when given, and every unknown or repeated id is
+    reported in one error. Ids missing from the cached set are looked up
+    with one query, so a set cached just before a row was committed does
+    not reject it.
+    """
+    default_error_messages = {
+        'duplicate': 'Повторяются id: {ids}',
+        'does_not_exist': 'Не найдены объекты с id: {ids}',
+    }
+
+    def __init__(self, queryset, id_namespace=None, key=None, **kwargs):
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+        self.queryset = queryset
+        self.id_namespace = id_namespace
+        self.key = key
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ids = [item[self.key] if self.key else item for item in items]
+        repeated = sorted(
+            value for value, count in Counter(ids).items() if count > 1
+        )
+        missing = self.find_missing(set(ids))
+        errors = []
+        if repeated:
+            errors.append(self.error_messages['duplicate'].format(
+                ids=', '.join(map(str, repeated))
+            ))
+        if missing:
+            errors.append(self.error_messages['does_not_exist'].format(
+                ids=', '.join(map(str, sorted(missing)))
+            ))
+        if errors:
+            raise serializers.ValidationError(errors)
+        return items
+
+    def find_missing(self, ids):
+        if self.id_namespace:
+            cached = known_ids(self.queryset, self.id_namespace)
+            ids = {value for value in ids if not contains(cached, value)}
+        if not ids:
+            return ids
+        return ids - self.queryset.in_bulk(ids).keys()
@@ -1,5 +1,5 @@
 from django_filters import (
-    CharFilter, FilterSet, ModelMultipleChoiceFilter
+    CharFilter, ChoiceFilter, FilterSet, ModelMultipleChoiceFilter
 )
 from django_filters import rest_framework as filters
 
@@ -9,20 +9,32 @@ from tags.models import Tag
 
 class IngredientFilter(FilterSet):
     name = CharFilter(
-        field_name='name',
-        lookup_expr='istartswith',
+        method='get_name',
     )
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def get_name(self, queryset, name, value):
+        return queryset.name_startswith(value)
+
+
+RECIPE_ORDERINGS = {
+    'newest': ('-pub_date', '-id'),
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
 
 class RecipeFilter(FilterSet):
+    search = CharFilter(
+        method='get_search',
+    )
     tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='get_tags',
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited',
@@ -30,24 +42,35 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    ordering = ChoiceFilter(
+        choices=tuple((name, name) for name in RECIPE_ORDERINGS),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
         fields = (
+            'search',
             'author',
             'tags',
             'is_favorited',
             'is_in_shopping_cart',
+            'ordering',
         )
 
+    def get_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def get_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.with_tags(value)
+
     def get_is_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return queryset.filter(favorites_recipe__user=user)
-        return Recipe.objects.all()
+        return queryset.filter_user_flag(name, self.request.user, value)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
-        user = self.request.user
-        if value:
-            return queryset.filter(shopping_cart__user=user)
-        return Recipe.objects.all()
+        return queryset.filter_user_flag(name, self.request.user, value)
+
+    def get_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,265 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class RequestMetrics:
+    """Timings of one request; attached to it as request.metrics."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = 'unresolved'
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_started = None
+        self.render_started = None
+        self.render_time = 0.0
+        self.wall_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    @property
+    def serialize_time(self):
+        """View and serializer code from view entry to rendering, minus SQL."""
+        if self.view_started is None:
+            return 0.0
+        ended = self.render_started or self.started + self.wall_time
+        return max(0.0, ended - self.view_started - self.db_time)
+
+    def server_timing(self, streaming=False):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={self.wall_time * 1000:.1f}',
+        ]
+        if streaming:
+            # Headers go out before the body, so its work is not included.
+            metrics.append('partial;desc="streamed body not included"')
+        return ', '.join(metrics)
+
+
+class MetricsRegistry:
+    """Per-process aggregates exported in the Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self.totals = defaultdict(lambda: defaultdict(float))
+
+    def record(self, metrics, status_code):
+        with self.lock:
+            self.requests[(metrics.view, status_code)] += 1
+            buckets = self.buckets[metrics.view]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if metrics.wall_time <= bound:
+                    buckets[index] += 1
+            totals = self.totals[metrics.view]
+            totals['count'] += 1
+            totals['wall'] += metrics.wall_time
+            totals['db'] += metrics.db_time
+            totals['queries'] += metrics.queries
+            totals['serialize'] += metrics.serialize_time
+            totals['render'] += metrics.render_time
+
+    def render(self):
+        with self.lock:
+            requests = dict(self.requests)
+            buckets = {view: list(row) for view, row in self.buckets.items()}
+            totals = {view: dict(row) for view, row in self.totals.items()}
+        lines = [
+            '# HELP foodgram_requests_total Handled requests.',
+            '# TYPE foodgram_requests_total counter',
+        ]
+        for (view, status_code), count in sorted(requests.items()):
+            lines.append(
+                f'foodgram_requests_total{{view="{view}",'
+                f'status="{status_code}"}} {count}'
+            )
+        lines += [
+            '# HELP foodgram_request_duration_seconds Wall time per request.',
+            '# TYPE foodgram_request_duration_seconds histogram',
+        ]
+        for view, row in sorted(buckets.items()):
+            for bound, count in zip(DURATION_BUCKETS, row):
+                lines.append(
+                    f'foodgram_request_duration_seconds_bucket'
+                    f'{{view="{view}",le="{bound}"}} {count}'
+                )
+            lines += [
+                f'foodgram_request_duration_seconds_bucket'
+                f'{{view="{view}",le="+Inf"}} {totals[view]["count"]:.0f}',
+                f'foodgram_request_duration_seconds_sum{{view="{view}"}} '
+                f'{totals[view]["wall"]:.6f}',
+                f'foodgram_request_duration_seconds_count{{view="{view}"}} '
+                f'{totals[view]["count"]:.0f}',
+            ]
+        for name, key, help_text in (
+            ('db_queries_total', 'queries', 'SQL queries executed.'),
+            ('db_duration_seconds_total', 'db', 'Time spent in SQL.'),
+            ('serialize_duration_seconds_total', 'serialize',
+             'Time spent in view and serializer code outside SQL.'),
+            ('render_duration_seconds_total', 'render',
+             'Time spent rendering responses.'),
+        ):
+            lines += [
+                f'# HELP foodgram_{name} {help_text}',
+                f'# TYPE foodgram_{name} counter',
+            ]
+            for view, row in sorted(totals.items()):
+                lines.append(
+                    f'foodgram_{name}{{view="{view}"}} {row[key]:.6f}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def view_name(view_func):
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return getattr(view_func, '__name__', 'unknown')
+    return view_class.__name__
+
+
+class ClosingStream:
+    """Streaming content that calls on_close once the server closes it."""
+
+    def __init__(self, content, on_close):
+        self.content = content
+        self.on_close = on_close
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+
+
+class MetricsMiddleware:
+    """Measure every request and report it via headers, logs and /metrics.
+
+    Goes first in MIDDLEWARE so the wall time covers the whole stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = request.metrics = RequestMetrics()
+        profiler = None
+        if random.random() < settings.METRICS_PROFILE_RATE:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+            if response.streaming:
+                # The body runs its queries after we return: keep counting
+                # until the server closes the response, then record it.
+                wrappers = stack.pop_all()
+
+                def finish_stream():
+                    wrappers.close()
+                    self.finish(request, response, profiler)
+
+                response.streaming_content = ClosingStream(
+                    response.streaming_content, finish_stream
+                )
+        metrics.wall_time = time.perf_counter() - metrics.started
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = metrics.server_timing(
+                response.streaming
+            )
+        if not response.streaming:
+            self.finish(request, response, profiler)
+        return response
+
+    def finish(self, request, response, profiler):
+        metrics = request.metrics
+        metrics.wall_time = time.perf_counter() - metrics.started
+        if profiler is not None:
+            profiler.disable()
+            self.dump_profile(profiler, metrics)
+        registry.record(metrics, response.status_code)
+        self.log_if_slow(request, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request.metrics
+        metrics.view = view_name(view_func)
+        actions = getattr(view_func, 'actions', None)
+        method = request.method.lower()
+        if actions:
+            metrics.view = f'{metrics.view}.{actions.get(method, method)}'
+        elif hasattr(view_func, 'cls'):
+            metrics.view = f'{metrics.view}.{method}'
+        metrics.view_started = time.perf_counter()
+
+    @staticmethod
+    def log_if_slow(request, metrics):
+        if (
+            metrics.wall_time * 1000 < settings.METRICS_SLOW_REQUEST_MS
+            and metrics.queries < settings.METRICS_QUERY_COUNT_WARNING
+        ):
+            return
+        logger.warning(
+            'Медленный запрос %s %s (%s): %.0f мс, SQL-запросов %d '
+            'за %.0f мс, сериализация %.0f мс',
+            request.method,
+            request.get_full_path(),
+            metrics.view,
+            metrics.wall_time * 1000,
+            metrics.queries,
+            metrics.db_time * 1000,
+            metrics.serialize_time * 1000,
+        )
+
+    @staticmethod
+    def dump_profile(profiler, metrics):
+        os.makedirs(settings.METRICS_PROFILE_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(
+            settings.METRICS_PROFILE_DIR,
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{metrics.view}-'
+            f'{metrics.wall_time * 1000:.0f}ms.prof',
+        ))
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that reports its own duration to the request metrics."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        metrics = getattr(request, 'metrics', None)
+        if metrics is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        metrics.render_started = time.perf_counter()
+        try:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        finally:
+            metrics.render_time = time.perf_counter() - metrics.render_started
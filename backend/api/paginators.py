@@ -1,6 +1,167 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPageNumberPaginator(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetPaginator(BasePagination):
+    """Seek pagination on the queryset ordering plus the primary key.
+
+    The cursor holds the ordering values of the last row of a page, so the
+    next page is a range read on the matching index instead of an OFFSET.
+    The total count is only computed on request (?count=true).
+    """
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, instance):
+        position = []
+        for field in self.ordering:
+            value = getattr(instance, field.lstrip('-'))
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    def keyset_filter(self, position):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['results'] = data
+        return Response(response)
+
+
+class TimelinePaginator(KeysetPaginator):
+    """Keyset pages of recipes whose ids come from a read function.
+
+    read(limit, position) returns the ids of up to limit recipes after
+    position, newest first; the recipes are then loaded from queryset.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def paginate_timeline(self, read, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        recipe_ids = read(self.page_size + 1, self.decode_cursor(request))
+        self.has_next = len(recipe_ids) > self.page_size
+        recipe_ids = recipe_ids[:self.page_size]
+        recipes = queryset.in_bulk(recipe_ids)
+        self.page = [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+        return self.page
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        return super().get_next_link()
+
+
+class FeedPaginator(CustomPageNumberPaginator):
+    """Page numbers by default, keyset pages with ?pagination=cursor."""
+    keyset_paginator_class = KeysetPaginator
+    query_params = ('page', 'limit', 'pagination', 'cursor', 'count')
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or KeysetPaginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_paginator_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
 from rest_framework import permissions
 
 
@@ -24,3 +26,16 @@ class IsAdminOrReadOnly(permissions.BasePermission):
         return request.method in permissions.SAFE_METHODS or (
             request.user.is_authenticated and request.user.is_admin
         )
+
+
+class IsMetricsScraper(permissions.BasePermission):
+    """Staff users, or a scraper presenting METRICS_TOKEN as a bearer."""
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        return bool(token) and constant_time_compare(
+            header, f'Bearer {token}'
+        )
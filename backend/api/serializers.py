@@ -1,12 +1,19 @@
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 
+from api.fields import (
+    CleanImageField,
+    ImageVariantsField,
+    PrimaryKeyListField,
+)
+from recipes import bulk, matching
 from recipes.models import (
     Favorite,
     Ingredient,
     IngredientAmount,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
 )
 from tags.models import Tag
 from tags.serializers import TagSerializer
@@ -17,7 +24,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit',)
 
 
 class IngredientAmountSerializer(serializers.ModelSerializer):
@@ -43,6 +50,7 @@ class GetRecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     cooking_time = serializers.IntegerField(min_value=1)
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -54,23 +62,19 @@ class GetRecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
+            'cart_count',
             'name',
             'image',
+            'images',
             'cooking_time',
             'text',
         )
-
-    def get_ingredients(self, obj):
-        queryset = IngredientAmount.objects.filter(recipe=obj)
-        return IngredientAmountSerializer(queryset, many=True).data
-
-    def get_favorited(self, obj):
-        return getattr(obj, 'is_favorited', False)
-
-    def get_shopping_cart(self, obj):
-        return getattr(obj, 'is_in_shopping_cart', False)
+        read_only_fields = ('favorites_count', 'cart_count')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -79,6 +83,8 @@ class GetRecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
@@ -86,8 +92,57 @@ class GetRecipeSerializer(serializers.ModelSerializer):
             user=request.user, recipe=obj).exists()
 
 
+class MatchedRecipeSerializer(GetRecipeSerializer):
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(GetRecipeSerializer.Meta):
+        fields = GetRecipeSerializer.Meta.fields + (
+            'matched_count',
+            'missing_count',
+        )
+
+
+class IngredientMatchQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=matching.MAX_QUERY_INGREDIENTS,
+    )
+    max_missing = serializers.IntegerField(min_value=0, required=False)
+
+
+class BulkRecipesSerializer(serializers.Serializer):
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=bulk.MAX_RECIPES,
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        max_length=bulk.MAX_RECIPES,
+    )
+
+    def validate(self, data):
+        if not data.get('add') and not data.get('remove'):
+            raise serializers.ValidationError(
+                'Передайте id рецептов в add или remove'
+            )
+        both = set(data.get('add', ())) & set(data.get('remove', ()))
+        if both:
+            raise serializers.ValidationError(
+                f'Рецепты одновременно в add и remove: {sorted(both)}'
+            )
+        # Keep the first occurrence, so statuses follow the request order.
+        return {
+            operation: list(dict.fromkeys(recipe_ids))
+            for operation, recipe_ids in data.items()
+        }
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField()
 
     class Meta:
@@ -96,12 +151,14 @@ class AddIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
+    tags = PrimaryKeyListField(queryset=Tag.objects.all(), id_namespace='tags')
+    ingredients = PrimaryKeyListField(
+        child=AddIngredientSerializer(),
+        queryset=Ingredient.objects.all(),
+        id_namespace='ingredients',
+        key='id',
     )
-    ingredients = AddIngredientSerializer(many=True)
-    image = Base64ImageField()
+    image = CleanImageField()
 
     class Meta:
         model = Recipe
@@ -118,39 +175,90 @@ class RecipeSerializer(serializers.ModelSerializer):
     def create_ingredients(ingredients_data, recipe):
         IngredientAmount.objects.bulk_create([IngredientAmount(
             recipe=recipe,
-            ingredient=ingredient['id'],
+            ingredient_id=ingredient['id'],
             amount=ingredient['amount']
         ) for ingredient in ingredients_data])
 
     @staticmethod
-    def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
-
+    def update_ingredients(ingredients_data, recipe):
+        """Bring the recipe's amounts in line with ingredients_data.
+
+        Only changed rows are touched, so untouched rows keep their ids.
+        Returns the old and new amounts keyed by ingredient id.
+        """
+        current = {
+            amount.ingredient_id: amount for amount in recipe.amounts.all()
+        }
+        old_amounts = {
+            ingredient_id: amount.amount
+            for ingredient_id, amount in current.items()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients_data
+        }
+        removed = old_amounts.keys() - new_amounts.keys()
+        if removed:
+            IngredientAmount.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            if ingredient_id in current and (
+                current[ingredient_id].amount != amount
+            ):
+                current[ingredient_id].amount = amount
+                changed.append(current[ingredient_id])
+        IngredientAmount.objects.bulk_update(changed, ('amount',))
+        IngredientAmount.objects.bulk_create([
+            IngredientAmount(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        ])
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
-        if 'tags' in validated_data:
-            tags = validated_data.pop('tags')
+        tags = validated_data.pop('tags')
         author = self.context.get('request').user
         ingredients = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
+        recipe.tags.set(tags)
         self.create_ingredients(ingredients, recipe)
+        Recipe.objects.filter(pk=recipe.pk).update_search_index()
+        matching.invalidate([recipe.pk])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
+        if 'tags' in validated_data:
+            instance.tags.set(validated_data.pop('tags'))
+        if 'ingredients' in validated_data:
+            ShoppingListItem.objects.change_recipe(
+                instance,
+                *self.update_ingredients(
+                    validated_data.pop('ingredients'), instance
+                ),
+            )
+            matching.invalidate([instance.pk])
+        instance = super().update(instance, validated_data)
+        Recipe.objects.filter(pk=instance.pk).update_search_index()
+        return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        # Reloaded with the prefetches, not one query per ingredient.
+        instance = Recipe.objects.with_related(request.user).get(
+            pk=instance.pk
+        )
         return GetRecipeSerializer(instance, context=context).data
 
 
 class SimpleRecipeSerializer(serializers.ModelSerializer):
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -158,27 +266,19 @@ class SimpleRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time',
         )
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    duplicate_message = 'Вы уже добавили этот рецепт в избранное'
+    absent_message = 'Этого рецепта нет в избранном'
 
     class Meta:
         model = Favorite
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-            return False
-        recipe = data['recipe']
-        if Favorite.objects.filter(user=request.user, recipe=recipe).exists():
-            raise serializers.ValidationError({
-                'status': 'Вы уже добавили этот рецепт в избранное'
-            })
-        return data
-
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
@@ -189,6 +289,8 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
+    duplicate_message = 'Этот рецепт уже в списке покупок'
+    absent_message = 'Этого рецепта нет в списке покупок'
 
     class Meta:
         model = ShoppingCart
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from api.views import (
     IngredientViewSet,
+    MetricsView,
     RecipeViewSet,
 )
 from tags.views import TagViewSet
@@ -14,5 +15,6 @@ router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
@@ -0,0 +1,87 @@
+"""Per-user recipe state: favorites, shopping cart and subscriptions.
+
+The ids are cached per user as sorted integer arrays, which pickle to a
+few bytes per id, and are overlaid on recipe data shared by all users.
+Keys carry a per-user version bumped on commit, so a state loaded before
+the commit and written after it lands under a key nobody reads.
+"""
+import time
+from array import array
+
+from django.conf import settings
+
+from api.cache import bump_version_on_commit, get_cache, get_version
+from recipes.models import Favorite, ShoppingCart
+from users.models import Following
+
+
+class UserState:
+
+    def __init__(self, favorites=(), cart=(), following=(), stamp=0):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.following = frozenset(following)
+        self.stamp = stamp
+
+    def apply(self, recipe):
+        recipe['is_favorited'] = recipe['id'] in self.favorites
+        recipe['is_in_shopping_cart'] = recipe['id'] in self.cart
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in self.following
+        )
+
+
+ANONYMOUS = UserState()
+
+
+def state_namespace(user_id):
+    return f'user_state:{user_id}'
+
+
+def id_array(queryset, field):
+    return array('q', queryset.order_by(field).values_list(field, flat=True))
+
+
+def load_state(user_id):
+    return (
+        time.time_ns(),
+        id_array(Favorite.objects.filter(user_id=user_id), 'recipe_id'),
+        id_array(ShoppingCart.objects.filter(user_id=user_id), 'recipe_id'),
+        id_array(Following.objects.filter(user_id=user_id), 'author_id'),
+    )
+
+
+def get_user_state(user):
+    if not user.is_authenticated:
+        return ANONYMOUS
+    cache = get_cache()
+    # Read before the database, so the state is at least this new.
+    namespace = state_namespace(user.id)
+    key = f'{namespace}:{get_version(namespace)}'
+    cached = cache.get(key)
+    if cached is None:
+        cached = load_state(user.id)
+        cache.set(key, cached, timeout=settings.API_CACHE_USER_STATE_TIMEOUT)
+    stamp, favorites, cart, following = cached
+    return UserState(favorites, cart, following, stamp)
+
+
+def invalidate_user_state(user_id):
+    bump_version_on_commit(state_namespace(user_id))
+
+
+def overlay(data, user):
+    """Set the user's flags on a recipe or a page of recipes in place.
+
+    Returns a tag that changes whenever the user's state does.
+    """
+    state = get_user_state(user)
+    if isinstance(data, dict) and 'results' in data:
+        recipes = data['results']
+    elif isinstance(data, dict):
+        recipes = [data]
+    else:
+        recipes = data
+    for recipe in recipes:
+        state.apply(recipe)
+    return f'{user.pk}:{state.stamp}'
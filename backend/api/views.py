@@ -1,33 +1,48 @@
-import csv
-
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.cache import CachedListMixin, SharedCacheMixin
+from api.metrics import registry
 from api.filters import IngredientFilter, RecipeFilter
-from api.permissions import IsOwnerOrReadOnly
+from api.permissions import IsMetricsScraper, IsOwnerOrReadOnly
 from api.serializers import (
+    BulkRecipesSerializer,
     FavoriteSerializer,
     GetRecipeSerializer,
+    IngredientMatchQuerySerializer,
     IngredientSerializer,
+    MatchedRecipeSerializer,
     RecipeSerializer,
     ShoppingCartSerializer
 )
+from api.shopping_list import SHOPPING_LIST_FORMATS
+from api.user_state import overlay
+from recipes import bulk, feed as timeline, matching
 from recipes.models import (
     Ingredient,
     Favorite,
     Recipe,
-    ShoppingCart
+    ShoppingCart,
+    ShoppingListItem,
+)
+from api.paginators import (
+    CustomPageNumberPaginator,
+    FeedPaginator,
+    TimelinePaginator,
 )
-from api.paginators import CustomPageNumberPaginator
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
@@ -35,36 +50,178 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        max_limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        try:
+            limit = min(
+                int(request.query_params.get('limit', max_limit)), max_limit
+            )
+        except ValueError:
+            return Response(
+                {'limit': 'Укажите целое число'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ingredients = Ingredient.objects.autocomplete(
+            request.query_params.get('name', ''), max(limit, 0)
+        )
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SharedCacheMixin, viewsets.ModelViewSet):
+    cache_namespace = 'recipes'
+    cache_query_params = (
+        *RecipeFilter.base_filters,
+        *FeedPaginator.query_params,
+    )
+    personal_query_params = ('is_favorited', 'is_in_shopping_cart')
+    lookup_value_regex = r'\d+'
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = (IsOwnerOrReadOnly,)
     ordering = ('-pub_date',)
-    pagination_class = CustomPageNumberPaginator
+    pagination_class = FeedPaginator
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'by_ingredients', 'feed'):
+            return Recipe.objects.with_related(self.request.user)
+        return super().get_queryset()
+
+    def personalize(self, request, data):
+        return overlay(data, request.user)
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action == 'by_ingredients':
+            return MatchedRecipeSerializer
+        if self.action in ('list', 'retrieve', 'feed'):
             return GetRecipeSerializer
         return RecipeSerializer
 
+    @action(detail=False, methods=['GET'])
+    def by_ingredients(self, request):
+        query = IngredientMatchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        matches = matching.get_index().match(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing'),
+            limit=matching.MATCH_RESULT_LIMIT,
+        )
+        paginator = CustomPageNumberPaginator()
+        page = paginator.paginate_queryset(matches, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        found = []
+        for recipe_id, matched, missing in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is not None:
+                recipe.matched_count = matched
+                recipe.missing_count = missing
+                found.append(recipe)
+        serializer = self.get_serializer(found, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        paginator = TimelinePaginator()
+        page = paginator.paginate_timeline(
+            lambda limit, position: timeline.read(
+                request.user, limit, position
+            ),
+            self.get_queryset(),
+            request,
+        )
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @staticmethod
     def actions_post(request, pk, serializers):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = serializers(context={'request': request})
+        # A duplicate check first would race with a concurrent request;
+        # the unique constraint of the single INSERT does not.
+        try:
+            with transaction.atomic():
+                instance = serializer.create(
+                    {'user': request.user, 'recipe_id': pk}
+                )
+        except IntegrityError:
+            get_object_or_404(Recipe, id=pk)
+            return Response(
+                {'error': serializers.duplicate_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            serializer.to_representation(instance),
+            status=status.HTTP_201_CREATED
+        )
 
     @staticmethod
-    def actions_delete(request, pk, model):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        model_obj = get_object_or_404(model, user=user, recipe=recipe)
-        model_obj.delete()
+    def actions_delete(request, pk, serializers):
+        [result] = bulk.remove(
+            serializers.Meta.model, request.user, [int(pk)]
+        )
+        if result['status'] != bulk.REMOVED:
+            get_object_or_404(Recipe, id=pk)
+            return Response(
+                {'error': serializers.absent_message},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def actions_bulk(request, model):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = {}
+        with transaction.atomic():
+            for operation, apply in (
+                ('remove', bulk.remove), ('add', bulk.add)
+            ):
+                recipe_ids = serializer.validated_data.get(operation)
+                if recipe_ids:
+                    results[operation] = apply(
+                        model, request.user, recipe_ids
+                    )
+        return Response(results)
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        return self.actions_bulk(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        return self.actions_bulk(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=['DELETE'],
+        permission_classes=[IsAuthenticated],
+    )
+    def clear_shopping_cart(self, request):
+        return Response({'remove': bulk.clear_cart(request.user)})
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=[IsAuthenticated],
+    )
+    def favorites_to_shopping_cart(self, request):
+        return Response({'add': bulk.favorites_to_cart(request.user)})
+
     @action(
         detail=True,
         methods=['POST'],
@@ -79,7 +236,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
         return self.actions_delete(
-            request=request, pk=pk, model=Favorite
+            request=request, pk=pk, serializers=FavoriteSerializer
         )
 
     @action(
@@ -95,7 +252,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
         return self.actions_delete(
-            request=request, pk=pk, model=ShoppingCart)
+            request=request, pk=pk, serializers=ShoppingCartSerializer
+        )
 
     @action(
         detail=False,
@@ -103,22 +261,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def download_shopping_cart(self, request):
-        shopping_cart = Recipe.objects.filter(
-            shopping_cart__user=request.user
-        ).order_by('ingredients__name').values(
-            'ingredients__name', 'ingredients__measurement_unit'
-        ).annotate(total_quantity=Sum('amounts__amount'))
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'error': 'Доступные форматы: '
+                          f'{", ".join(SHOPPING_LIST_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        render, content_type = SHOPPING_LIST_FORMATS[file_format]
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
+        ).annotate(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+        ).values('name', 'measurement_unit', 'total_amount').order_by('name')
 
-        response = HttpResponse(content_type='txt/csv')
+        response = StreamingHttpResponse(
+            render(ingredients.iterator()),
+            content_type=content_type,
+        )
         response['Content-Disposition'] = (
-            'attachment; filename=shopping_list.txt'
+            f'attachment; filename=shopping_list.{file_format}'
         )
-        writer = csv.writer(response)
-
-        for item in shopping_cart:
-            writer.writerow([
-                f"{item['ingredients__name']} - "
-                f"({item['total_quantity']} "
-                f"{item['ingredients__measurement_unit']})"
-            ])
         return response
+
+
+class MetricsView(APIView):
+    permission_classes = (IsMetricsScraper,)
+
+    def get(self, request):
+        return HttpResponse(
+            registry.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
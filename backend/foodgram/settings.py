@@ -20,13 +20,14 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
     'djoser',
-    'recipes',
-    'users',
-    'tags',
+    'recipes.apps.RecipesConfig',
+    'users.apps.UsersConfig',
+    'tags.apps.TagsConfig',
     'api',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,6 +77,35 @@ DATABASES = {
 #     }
 # }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
+API_CACHE_ALIAS = 'default'
+
+# Tag and ingredient lists. Version bumps by management commands and other
+# workers do not reach a per-process cache, so with the default backend
+# this bounds how stale they get; raise it with a shared CACHE_BACKEND.
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', default=5 * 60))
+
+# Anonymous recipe pages: counters in them may lag by the cache timeout.
+API_CACHE_RESPONSE_TIMEOUT = 5 * 60
+API_CACHE_MAX_AGE = 60
+API_CACHE_USER_STATE_TIMEOUT = 10 * 60
+API_CACHE_LOCK_TIMEOUT = 5
+API_CACHE_LOCK_POLL = 0.05
+
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 300
+# Also keep users in the API cache, shared by all workers.
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', default='') == 'true'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -104,9 +134,21 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# Files of load_ingrs and load_tags: data/ of the repository by default.
+DATA_ROOT = os.getenv(
+    'DATA_ROOT', default=os.path.join(os.path.dirname(BASE_DIR), 'data')
+)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
@@ -135,8 +177,43 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 6,
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (320, 320),
+    'card': (640, 640),
+    'full': (1600, 1600),
 }
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default=2))
+
+TRENDING_HALF_LIFE_HOURS = 48
+TRENDING_WINDOW_DAYS = 14
+
+FEED_MAX_LENGTH = 500
+# Recipes of authors with more followers are pulled into feeds on read.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MAX_FOLLOWERS', default=10000)
+)
+# ...and copied into feeds again only under this many, so a follow at the
+# boundary does not switch the author back and forth.
+FEED_FANOUT_MIN_FOLLOWERS = int(
+    os.getenv('FEED_FANOUT_MIN_FOLLOWERS', default=8000)
+)
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+# Exposes query counts and timings to every client, so only for debugging.
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', default='') == 'true'
+METRICS_SLOW_REQUEST_MS = int(os.getenv('METRICS_SLOW_REQUEST_MS', default=500))
+METRICS_QUERY_COUNT_WARNING = 50
+METRICS_PROFILE_RATE = float(os.getenv('METRICS_PROFILE_RATE', default=0))
+METRICS_PROFILE_DIR = os.getenv(
+    'METRICS_PROFILE_DIR', default=os.path.join(BASE_DIR, 'profiles')
+)
@@ -1,14 +1,48 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
 from django.contrib import admin
+from django.db.models import Q
 
+from api.cache import bump_version_on_commit
+from recipes import matching
 from recipes.models import (
     Favorite,
+    FeedEntry,
     Ingredient,
     IngredientAmount,
     Recipe,
     ShoppingCart,
+    ShoppingListItem,
 )
 
 
+@contextmanager
+def tracking_amounts(get_queryset):
+    """Pass changes of the amounts in get_queryset() to shopping lists
+    and the ingredient index.
+
+    IngredientAmount has no signals, so that deleting a recipe removes
+    its amounts in one query, and admin edits are diffed here instead.
+    """
+    def amounts_by_recipe():
+        amounts = defaultdict(dict)
+        for recipe_id, ingredient_id, amount in get_queryset().values_list(
+            'recipe_id', 'ingredient_id', 'amount'
+        ):
+            amounts[recipe_id][ingredient_id] = amount
+        return amounts
+
+    before = amounts_by_recipe()
+    yield
+    after = amounts_by_recipe()
+    for recipe_id in before.keys() | after.keys():
+        ShoppingListItem.objects.change_recipe(
+            recipe_id, before.get(recipe_id, {}), after.get(recipe_id, {})
+        )
+    matching.invalidate(before.keys() | after.keys())
+
+
 class IngredientAdmin(admin.ModelAdmin):
     list_display = (
         'id',
@@ -33,9 +67,12 @@ class RecipeAdmin(admin.ModelAdmin):
         'name',
         'image',
         'text',
+        'favorites_count',
+        'cart_count',
     )
+    list_select_related = ('author',)
+    # Recipe names and texts are searched through the full-text index.
     search_fields = (
-        'name',
         'author__username',
         'author__email',
     )
@@ -47,6 +84,24 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline,)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        by_author, use_distinct = super().get_search_results(
+            request, queryset, search_term
+        )
+        return queryset.filter(
+            Q(pk__in=queryset.search(search_term).values('pk'))
+            | Q(pk__in=by_author.values('pk'))
+        ), use_distinct
+
+    def save_related(self, request, form, formsets, change):
+        with tracking_amounts(
+            lambda: IngredientAmount.objects.filter(recipe=form.instance)
+        ):
+            super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(pk=form.instance.pk).update_search_index()
+
 
 class IngredientAmountAdmin(admin.ModelAdmin):
     list_display = (
@@ -62,6 +117,28 @@ class IngredientAmountAdmin(admin.ModelAdmin):
     )
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        with tracking_amounts(
+            lambda: IngredientAmount.objects.filter(pk=obj.pk)
+        ):
+            super().save_model(request, obj, form, change)
+        bump_version_on_commit('recipes')
+
+    def delete_model(self, request, obj):
+        with tracking_amounts(
+            lambda: IngredientAmount.objects.filter(pk=obj.pk)
+        ):
+            super().delete_model(request, obj)
+        bump_version_on_commit('recipes')
+
+    def delete_queryset(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        with tracking_amounts(
+            lambda: IngredientAmount.objects.filter(pk__in=pks)
+        ):
+            super().delete_queryset(request, queryset)
+        bump_version_on_commit('recipes')
+
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = (
@@ -91,8 +168,42 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'total_amount',
+    )
+    search_fields = (
+        'user__username',
+        'user__email',
+        'ingredient__name',
+    )
+    empty_value_display = '-пусто-'
+
+
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'recipe',
+        'author',
+        'pub_date',
+    )
+    list_select_related = ('user', 'recipe', 'author')
+    search_fields = (
+        'user__username',
+        'user__email',
+        'recipe__name',
+    )
+    empty_value_display = '-пусто-'
+
+
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(IngredientAmount, IngredientAmountAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(ShoppingCart, ShoppingCartAdmin)
+admin.site.register(ShoppingListItem, ShoppingListItemAdmin)
+admin.site.register(FeedEntry, FeedEntryAdmin)
@@ -0,0 +1,166 @@
+"""Batch changes of favorites and shopping carts.
+
+Rows are written with one INSERT or DELETE ... RETURNING, which skips
+model signals: what they maintain for single rows, the recipe counters,
+the shopping list and the cached user state, is updated here explicitly
+for the rows the statement actually changed. RETURNING needs SQLite 3.35
+or PostgreSQL.
+"""
+from itertools import islice
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from api.user_state import invalidate_user_state
+from recipes.counters import change_counters
+from recipes.models import Favorite, Recipe, ShoppingCart, ShoppingListItem
+
+MAX_RECIPES = 500
+BATCH_SIZE = 500
+COUNTER_FIELDS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'cart_count',
+}
+
+ADDED = 'added'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+REMOVED = 'removed'
+ABSENT = 'absent'
+
+
+def batches(values):
+    values = iter(values)
+    while True:
+        batch = list(islice(values, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_new(model, user, recipe_ids):
+    """INSERT ... ON CONFLICT DO NOTHING; return the recipe ids inserted.
+
+    bulk_create cannot tell which rows a conflict skipped, and another
+    request may insert one meanwhile: its row must not be counted again.
+    """
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(name).column)
+        for name in ('user', 'recipe', 'added')
+    )
+    added = connection.ops.adapt_datetimefield_value(timezone.now())
+    inserted = set()
+    with connection.cursor() as cursor:
+        for batch in batches(recipe_ids):
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                f'ON CONFLICT DO NOTHING '
+                f'RETURNING {quote(model._meta.get_field("recipe").column)}',
+                [
+                    value
+                    for recipe_id in batch
+                    for value in (user.pk, recipe_id, added)
+                ],
+            )
+            inserted.update(recipe_id for recipe_id, in cursor.fetchall())
+    return inserted
+
+
+def delete_returning(model, user, field, values=None):
+    """DELETE ... RETURNING; return the values of field in removed rows.
+
+    Without values every row of user goes. Of concurrent requests only
+    the one whose DELETE removed a row sees it, so derived data driven
+    by the result changes once.
+    """
+    connection = connections[model.objects.db]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    user_column = quote(model._meta.get_field('user').column)
+    column = quote(model._meta.get_field(field).column)
+    removed = set()
+    with connection.cursor() as cursor:
+        if values is None:
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'RETURNING {column}',
+                [user.pk],
+            )
+            return {value for value, in cursor.fetchall()}
+        for batch in batches(values):
+            cursor.execute(
+                f'DELETE FROM {table} WHERE {user_column} = %s '
+                f'AND {column} IN ({", ".join(["%s"] * len(batch))}) '
+                f'RETURNING {column}',
+                [user.pk, *batch],
+            )
+            removed.update(value for value, in cursor.fetchall())
+    return removed
+
+
+def recipes_removed(model, user, recipe_ids):
+    """Update what the removed favorites or cart rows maintained."""
+    if not recipe_ids:
+        return
+    change_counters(Recipe, recipe_ids, COUNTER_FIELDS[model], -1)
+    if model is ShoppingCart:
+        ShoppingListItem.objects.remove_recipes(user.id, recipe_ids)
+    invalidate_user_state(user.id)
+
+
+def statuses(recipe_ids, changes, default):
+    return [
+        {'id': recipe_id, 'status': changes.get(recipe_id, default)}
+        for recipe_id in recipe_ids
+    ]
+
+
+@transaction.atomic
+def add(model, user, recipe_ids):
+    """Add recipes to the favorites or the cart of user in one INSERT.
+
+    Recipes added meanwhile by another request are reported as EXISTS.
+    """
+    found = set(Recipe.objects.filter(
+        pk__in=recipe_ids
+    ).values_list('id', flat=True))
+    existing = set(model.objects.filter(
+        user=user, recipe_id__in=found
+    ).values_list('recipe_id', flat=True))
+    added = insert_new(model, user, found - existing)
+    if added:
+        change_counters(Recipe, added, COUNTER_FIELDS[model], 1)
+        if model is ShoppingCart:
+            ShoppingListItem.objects.add_recipes(user.id, added)
+        invalidate_user_state(user.id)
+    return statuses(
+        recipe_ids,
+        {**dict.fromkeys(found, EXISTS), **dict.fromkeys(added, ADDED)},
+        NOT_FOUND,
+    )
+
+
+@transaction.atomic
+def remove(model, user, recipe_ids):
+    """Remove recipes from the favorites or the cart of user."""
+    removed = delete_returning(model, user, 'recipe', recipe_ids)
+    recipes_removed(model, user, removed)
+    return statuses(recipe_ids, dict.fromkeys(removed, REMOVED), ABSENT)
+
+
+@transaction.atomic
+def clear_cart(user):
+    removed = delete_returning(ShoppingCart, user, 'recipe')
+    recipes_removed(ShoppingCart, user, removed)
+    return statuses(
+        sorted(removed), dict.fromkeys(removed, REMOVED), ABSENT
+    )
+
+
+def favorites_to_cart(user):
+    return add(ShoppingCart, user, list(Favorite.objects.filter(
+        user=user
+    ).order_by('-added').values_list('recipe_id', flat=True)))
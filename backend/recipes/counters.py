@@ -0,0 +1,30 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pk, field, delta):
+    """Atomically shift a denormalized counter, never below zero."""
+    change_counters(model, [pk], field, delta)
+
+
+def change_counters(model, pks, field, delta):
+    """change_counter for many rows in one UPDATE."""
+    rows = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def expected_count(related_model, related_field):
+    """Subquery counting related_model rows pointing at the outer row."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
@@ -0,0 +1,189 @@
+"""Feeds of recipes by followed authors.
+
+A new recipe is copied into the feed of every follower of its author
+(fan-out on write). Authors reaching FEED_FANOUT_MAX_FOLLOWERS followers
+are switched to feed_pulled, since one recipe would mean that many
+inserts; their recipes are merged into feeds when they are read (fan-out
+on read). They are switched back only under FEED_FANOUT_MIN_FOLLOWERS.
+Switching costs a row per follower and recipe, so requests only flip the
+flag towards pulling, which is correct at once; settle(), run by
+rebuild_feeds --settle, drops the copies of pulled authors and copies
+the recipes of those back under the low watermark. Feeds are trimmed to
+FEED_MAX_LENGTH by rebuild_feeds --trim.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from recipes.counters import change_counter
+from recipes.models import FeedEntry, Recipe
+from users.models import CustomUser, Following
+
+BATCH_SIZE = 500
+
+
+def fans_out(author_id):
+    """Lock the author row until commit, so settle() waits for the copy."""
+    return bool(CustomUser.objects.select_for_update().filter(
+        pk=author_id, feed_pulled=False
+    ).values_list('pk', flat=True))
+
+
+def followers(author_id):
+    return Following.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+
+
+def latest_recipes(author_id):
+    return list(Recipe.objects.filter(
+        author_id=author_id
+    ).order_by('-pub_date', '-id').values_list(
+        'id', 'pub_date'
+    )[:settings.FEED_MAX_LENGTH])
+
+
+def fan_out(author_id, user_ids, recipes):
+    """Copy (recipe_id, pub_date) pairs of an author into feeds of user_ids."""
+    if not recipes:
+        return
+    user_ids = iter(user_ids)
+    while True:
+        batch = list(islice(user_ids, max(1, BATCH_SIZE // len(recipes))))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    author_id=author_id,
+                    pub_date=pub_date,
+                )
+                for user_id in batch
+                for recipe_id, pub_date in recipes
+            ],
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+
+def publish(recipe):
+    """Add a new recipe to the feeds of the author's followers."""
+    with transaction.atomic():
+        if fans_out(recipe.author_id):
+            fan_out(
+                recipe.author_id,
+                followers(recipe.author_id),
+                [(recipe.id, recipe.pub_date)],
+            )
+
+
+def follow(user_id, author_id):
+    """Backfill the feed with the latest recipes of a new subscription."""
+    with transaction.atomic():
+        if fans_out(author_id):
+            fan_out(author_id, [user_id], latest_recipes(author_id))
+
+
+def followers_changed(author_id, delta):
+    """Shift followers_count, switching the author to pulled at the top.
+
+    The copies already in feeds stay until settle(); read() skips them.
+    """
+    change_counter(CustomUser, author_id, 'followers_count', delta)
+    if delta > 0:
+        CustomUser.objects.filter(
+            pk=author_id,
+            feed_pulled=False,
+            followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        ).update(feed_pulled=True)
+
+
+def settle():
+    """Finish the switches followers_changed left.
+
+    Pulled authors under FEED_FANOUT_MIN_FOLLOWERS are copied into the
+    feeds of their followers before they stop being pulled, so their
+    recipes never leave a feed meanwhile. Returns the number of authors
+    switched back and of copies dropped.
+    """
+    switched = 0
+    pushed = CustomUser.objects.filter(
+        feed_pulled=True,
+        followers_count__lt=settings.FEED_FANOUT_MIN_FOLLOWERS,
+    )
+    for author_id in pushed.values_list('id', flat=True):
+        with transaction.atomic():
+            # Locked, so no follow or publish misses the switch.
+            if not pushed.select_for_update().filter(
+                pk=author_id
+            ).values_list('pk', flat=True):
+                continue
+            fan_out(author_id, followers(author_id), latest_recipes(author_id))
+            CustomUser.objects.filter(pk=author_id).update(feed_pulled=False)
+            switched += 1
+    dropped, _ = FeedEntry.objects.filter(author__feed_pulled=True).delete()
+    return switched, dropped
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def older_than(position, date_field, id_field):
+    pub_date, recipe_id = position
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(**{
+        date_field: pub_date, f'{id_field}__lt': recipe_id,
+    })
+
+
+def read(user, limit, position=None):
+    """Ids of the next limit recipes of the feed after position.
+
+    position is the (pub_date, id) of the last recipe already shown. Both
+    sources are range reads on an index ordered the same way, so the page
+    is a merge of two sorted lists.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(
+        author__in=Following.objects.filter(
+            user=user, author__feed_pulled=True,
+        ).values('author_id')
+    )
+    if position is not None:
+        entries = entries.filter(older_than(position, 'pub_date', 'recipe'))
+        pulled = pulled.filter(older_than(position, 'pub_date', 'id'))
+    merged = heapq.merge(
+        entries.order_by('-pub_date', '-recipe').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit],
+        pulled.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id'
+        )[:limit],
+        reverse=True,
+    )
+    recipe_ids = []
+    for _, recipe_id in merged:
+        # A pulled author may still have copies until settle().
+        if recipe_id not in recipe_ids:
+            recipe_ids.append(recipe_id)
+    return recipe_ids[:limit]
+
+
+def trim(user_id):
+    """Drop the entries of a feed beyond FEED_MAX_LENGTH."""
+    boundary = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe'
+    ).values_list('pub_date', 'recipe_id')[
+        settings.FEED_MAX_LENGTH - 1:settings.FEED_MAX_LENGTH
+    ]
+    if not boundary:
+        return 0
+    deleted, _ = FeedEntry.objects.filter(
+        older_than(boundary[0], 'pub_date', 'recipe'), user_id=user_id
+    ).delete()
+    return deleted
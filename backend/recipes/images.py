@@ -0,0 +1,145 @@
+import io
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from api.cache import bump_version
+from recipes.storage import media_storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# The stored original, re-encoded once so no EXIF or GPS data is kept.
+ORIGINAL_FORMATS = {
+    'jpg': ('JPEG', {'quality': 92, 'optimize': True}),
+    'png': ('PNG', {'optimize': True}),
+}
+VARIANTS_ROOT = 'recipes/variants'
+ORPHAN_GRACE = timedelta(hours=1)
+
+_executor = None
+
+
+def open_image(data):
+    """Decode the source once, applying and then dropping EXIF orientation."""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if 'A' in image.getbands() or 'transparency' in image.info:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def encode(image, extension, formats=IMAGE_FORMATS):
+    """Save without passing exif/icc, so no metadata reaches the output."""
+    image_format, options = formats[extension]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def clean_upload(data):
+    """Decode an upload; return the image, its extension and clean bytes."""
+    image = open_image(data)
+    extension = 'png' if image.mode == 'RGBA' else 'jpg'
+    return image, extension, encode(image, extension, ORIGINAL_FORMATS)
+
+
+def store(data, variant, extension):
+    return media_storage.save(
+        f'{VARIANTS_ROOT}/{variant}/image.{extension}', ContentFile(data)
+    )
+
+
+def render_variants(image):
+    variants = {}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {
+            extension: store(encode(resized, extension), variant, extension)
+            for extension in IMAGE_FORMATS
+        }
+    return variants
+
+
+def process_recipe_image(recipe_id, source, image=None):
+    """Render the variants, from image when the upload was just decoded."""
+    from recipes.models import Recipe
+
+    try:
+        if image is None:
+            with media_storage.open(source) as file:
+                image = open_image(file.read())
+        variants = render_variants(image)
+    except (OSError, ValueError):
+        logger.exception('Не удалось обработать изображение %s', source)
+        return
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(
+        image_variants=json.dumps({'source': source, 'variants': variants})
+    ):
+        bump_version('recipes')
+
+
+def run_in_worker(*args):
+    try:
+        process_recipe_image(*args)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Render the variants once the transaction commits.
+
+    With RECIPE_IMAGE_WORKERS = 0 the work runs inline in the request.
+    """
+    args = (
+        recipe.pk, recipe.image.name, getattr(recipe, 'decoded_image', None)
+    )
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(run_in_worker, *args)
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(*args))
+
+
+def release_image(name, grace=ORPHAN_GRACE):
+    """Delete an uploaded photo once no recipe references it.
+
+    Files touched within the grace period may belong to a recipe that is
+    still being saved, so they are left for collect_media.
+    """
+    from recipes.models import Recipe
+
+    if not name or Recipe.objects.filter(image=name).exists():
+        return False
+    if not media_storage.exists(name) or not media_storage.is_stale(
+        name, grace
+    ):
+        return False
+    media_storage.delete(name)
+    return True
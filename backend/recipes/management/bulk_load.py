@@ -0,0 +1,123 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.cache import bump_version
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError('должно быть больше нуля')
+    return number
+
+
+def read_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def read_json(file, chunk_size=JSON_CHUNK_SIZE):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив объектов')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+class BulkLoadCommand(BaseCommand):
+    """Load a CSV or JSON file with batched INSERT ... ON CONFLICT DO NOTHING.
+
+    Everything runs in one transaction, so a broken file leaves no partial
+    state behind; --dry-run performs the load and rolls it back.
+    """
+    model = None
+    fields = ()
+    default_filename = None
+    cache_namespace = None
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', default=self.default_filename,
+                            nargs='?', type=str)
+        parser.add_argument('--data-root', default=settings.DATA_ROOT,
+                            help='directory of the file, DATA_ROOT by default')
+        parser.add_argument('--batch-size', type=positive_int, default=1000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def make_object(self, row):
+        return self.model(**row)
+
+    def read_rows(self, file, path):
+        if path.endswith('.json'):
+            return read_json(file)
+        return read_csv(file, self.fields)
+
+    def insert(self, batch):
+        self.model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def load(self, path, batch_size):
+        read = 0
+        batch = []
+        with open(path, 'r', encoding='utf-8') as file:
+            for row in self.read_rows(file, path):
+                batch.append(self.make_object(row))
+                read += 1
+                if len(batch) >= batch_size:
+                    self.insert(batch)
+                    batch = []
+                    self.stdout.write(f'Прочитано строк: {read}', ending='\r')
+            if batch:
+                self.insert(batch)
+        return read
+
+    def handle(self, *args, **options):
+        path = os.path.join(options['data_root'], options['filename'])
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                before = self.model.objects.count()
+                read = self.load(path, options['batch_size'])
+                created = self.model.objects.count() - before
+                transaction.set_rollback(options['dry_run'])
+        except FileNotFoundError:
+            raise CommandError(
+                f'Добавьте файл {options["filename"]} '
+                f'в директорию {options["data_root"]}'
+            )
+        except (KeyError, TypeError, ValueError) as error:
+            raise CommandError(f'Файл не загружен: {error!r}')
+        if not options['dry_run'] and created:
+            bump_version(self.cache_namespace)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{"[dry-run] " if options["dry_run"] else ""}'
+            f'Прочитано строк: {read}, добавлено: {created}, '
+            f'пропущено дубликатов: {read - created}, '
+            f'{read / elapsed if elapsed else read:.0f} строк/с'
+        ))
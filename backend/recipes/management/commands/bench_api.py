@@ -0,0 +1,261 @@
+import json
+import random
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.authentication import local_tokens
+from api.cache import get_cache
+from recipes.management.bulk_load import positive_int
+from recipes.management.commands.seed_bench_data import USERNAME_PREFIX
+from recipes.models import Ingredient, Recipe
+from tags.models import Tag
+from users.models import CustomUser
+
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+
+
+def count_queries(server_timing):
+    """Query count from a Server-Timing header, None if unknown or partial."""
+    match = QUERIES_PATTERN.search(server_timing)
+    if match is None or 'partial;' in server_timing:
+        return None
+    return int(match.group(1))
+
+
+class LocalTransport:
+    """Requests through the Django test client: no network or server."""
+
+    def __init__(self, token):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token else {}
+        self.client = Client(**headers)
+
+    def request(self, method, path):
+        response = self.client.generic(method, path)
+        if response.streaming:
+            # Reading to the end closes the response, which finishes the
+            # metrics of queries run while streaming.
+            b''.join(response.streaming_content)
+        return response.status_code, response.wsgi_request.metrics.queries
+
+    def get(self, path):
+        return self.request('GET', path)
+
+
+class HTTPTransport:
+    """Requests to a running server, e.g. gunicorn behind nginx."""
+
+    def __init__(self, token, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Authorization': f'Token {token}'} if token else {}
+
+    def request(self, method, path):
+        request = urllib.request.Request(
+            self.base_url + path, headers=self.headers, method=method
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                return response.status, count_queries(
+                    response.headers.get('Server-Timing', '')
+                )
+        except urllib.error.HTTPError as error:
+            return error.code, count_queries(
+                error.headers.get('Server-Timing', '')
+            )
+
+    def get(self, path):
+        return self.request('GET', path)
+
+
+class Command(BaseCommand):
+    help = (
+        'measuring API latency percentiles on the seed_bench_data dataset '
+        'and saving them as JSON for comparison between commits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--base-url',
+                            help='benchmark a running server instead; '
+                                 'SQL counts need METRICS_SERVER_TIMING=true')
+        parser.add_argument('--only', nargs='+', metavar='ENDPOINT')
+        parser.add_argument('--output', help='write results to this file')
+        parser.add_argument('--compare', help='earlier results file')
+        parser.add_argument('--label', default='',
+                            help='e.g. the commit being measured')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--anonymous', action='store_true',
+                            help='send requests without a token')
+        parser.add_argument('--concurrency', type=positive_int, default=1,
+                            help='parallel clients, one thread each')
+        parser.add_argument('--cold', action='store_true',
+                            help='clear the API and token caches before '
+                                 'every request; with --base-url only a '
+                                 'shared CACHE_BACKEND is cleared')
+
+    @staticmethod
+    def endpoints(rng):
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:1000])
+        authors = list(CustomUser.objects.filter(
+            recipes_count__gt=0
+        ).values_list('id', flat=True)[:1000])
+        tags = list(Tag.objects.values_list('slug', flat=True))
+        ingredients = list(Ingredient.objects.filter(
+            amounts__isnull=False
+        ).distinct().values_list('id', flat=True)[:1000])
+        words = ['рецепт', 'смешать', 'соль', 'масло', 'сыр']
+        if not recipes or not tags or not ingredients:
+            raise CommandError('Сначала выполните seed_bench_data')
+        return {
+            'recipe_list': lambda: '/api/recipes/',
+            'recipe_list_cursor': lambda: '/api/recipes/?pagination=cursor',
+            'recipe_detail': lambda: f'/api/recipes/{rng.choice(recipes)}/',
+            'filter_tags': lambda: f'/api/recipes/?tags={rng.choice(tags)}',
+            'search': lambda: f'/api/recipes/?search={rng.choice(words)}',
+            'by_ingredients': lambda: (
+                '/api/recipes/by_ingredients/?' + '&'.join(
+                    f'ingredients={ingredient}'
+                    for ingredient in rng.sample(ingredients, 5)
+                )
+            ),
+            'filter_author': (
+                lambda: f'/api/recipes/?author={rng.choice(authors)}'
+            ),
+            'filter_is_favorited': lambda: '/api/recipes/?is_favorited=1',
+            'filter_is_in_shopping_cart': (
+                lambda: '/api/recipes/?is_in_shopping_cart=1'
+            ),
+            'feed': lambda: '/api/recipes/feed/',
+            'subscriptions': (
+                lambda: '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'download_shopping_cart': (
+                lambda: '/api/recipes/download_shopping_cart/'
+            ),
+        }
+
+    @staticmethod
+    def percentile(timings, share):
+        return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+    @staticmethod
+    def send(transport, paths, cold):
+        samples = []
+        try:
+            for path in paths:
+                if cold:
+                    get_cache().clear()
+                    local_tokens.clear()
+                started = time.perf_counter()
+                status_code, query_count = transport.get(path)
+                samples.append((
+                    (time.perf_counter() - started) * 1000,
+                    status_code,
+                    query_count,
+                ))
+        finally:
+            connections.close_all()
+        return samples
+
+    def measure(self, transports, make_path, options):
+        for _ in range(options['warmup']):
+            transports[0].get(make_path())
+        # Paths are drawn up front: the shared Random is not thread-safe.
+        paths = [make_path() for _ in range(options['requests'])]
+        workers = len(transports)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            chunks = pool.map(
+                self.send,
+                transports,
+                [paths[index::workers] for index in range(workers)],
+                [options['cold']] * workers,
+            )
+            samples = [sample for chunk in chunks for sample in chunk]
+        elapsed = time.perf_counter() - started
+        timings = sorted(timing for timing, _, _ in samples)
+        errors = sum(status_code >= 400 for _, status_code, _ in samples)
+        queries = [count for _, _, count in samples if count is not None]
+        return {
+            'requests': len(timings),
+            'errors': errors,
+            'rps': round(len(timings) / elapsed, 1),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'p50_ms': round(self.percentile(timings, 0.5), 2),
+            'p95_ms': round(self.percentile(timings, 0.95), 2),
+            'p99_ms': round(self.percentile(timings, 0.99), 2),
+            'queries': round(statistics.mean(queries), 1) if queries else None,
+        }
+
+    def report(self, results, baseline):
+        self.stdout.write(
+            f'{"endpoint":<28}{"rps":>8}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"sql":>6}{"err":>5}'
+        )
+        for name, row in results.items():
+            line = (
+                f'{name:<28}{row["rps"]:>8}{row["p50_ms"]:>9}'
+                f'{row["p95_ms"]:>9}{row["p99_ms"]:>9}'
+                f'{row["queries"] if row["queries"] is not None else "-":>6}'
+                f'{row["errors"]:>5}'
+            )
+            before = baseline.get(name)
+            if before:
+                change = (row['p95_ms'] / before['p95_ms'] - 1) * 100
+                line += f'   p95 {change:+.0f}%'
+            self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('Сначала выполните seed_bench_data')
+        token, _ = Token.objects.get_or_create(user=user)
+        key = None if options['anonymous'] else token.key
+        transports = [
+            HTTPTransport(key, options['base_url']) if options['base_url']
+            else LocalTransport(key)
+            for _ in range(options['concurrency'])
+        ]
+        endpoints = self.endpoints(random.Random(options['seed']))
+        unknown = set(options['only'] or ()) - endpoints.keys()
+        if unknown:
+            raise CommandError(f'Неизвестные эндпоинты: {sorted(unknown)}')
+        baseline = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+        results = {
+            name: self.measure(transports, make_path, options)
+            for name, make_path in endpoints.items()
+            if not options['only'] or name in options['only']
+        }
+        self.report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'label': options['label'],
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'database': connection.vendor,
+                    'target': options['base_url'] or 'local',
+                    'concurrency': options['concurrency'],
+                    'cold': options['cold'],
+                    'dataset': {
+                        'users': CustomUser.objects.count(),
+                        'recipes': Recipe.objects.count(),
+                    },
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
@@ -0,0 +1,83 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.management.bulk_load import positive_int
+from recipes.models import Ingredient
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+class Command(BaseCommand):
+    help = (
+        'measuring ingredient autocomplete latency on synthetic catalogs; '
+        'all generated rows are rolled back'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=positive_int,
+                            default=[2000, 50000, 500000])
+        parser.add_argument('--batch-size', type=positive_int, default=5000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    @staticmethod
+    def random_name(rng):
+        return ' '.join(
+            ''.join(rng.choices(ALPHABET, k=rng.randint(3, 10)))
+            for _ in range(rng.randint(1, 3))
+        )
+
+    @staticmethod
+    def percentile(timings, share):
+        return timings[min(len(timings) - 1, int(len(timings) * share))]
+
+    def fill(self, size, rng, batch_size):
+        missing = size - Ingredient.objects.count()
+        while missing > 0:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(
+                        name=name, search_name=name, measurement_unit='г'
+                    )
+                    for name in (
+                        self.random_name(rng)
+                        for _ in range(min(missing, batch_size))
+                    )
+                ),
+                ignore_conflicts=True,
+            )
+            # Random names repeat, and unique_ingredient skips the repeats.
+            missing = size - Ingredient.objects.count()
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE recipes_ingredient')
+
+    def measure(self, size, options, rng):
+        names = list(Ingredient.objects.values_list(
+            'search_name', flat=True
+        )[:5000])
+        timings = []
+        for _ in range(options['queries']):
+            name = rng.choice(names)
+            prefix = name[:rng.randint(1, min(4, len(name)))]
+            started = time.perf_counter()
+            Ingredient.objects.autocomplete(prefix, options['limit'])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f'{size:>8} ингредиентов: '
+            f'p50 {self.percentile(timings, 0.5):.2f} мс, '
+            f'p99 {self.percentile(timings, 0.99):.2f} мс'
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        for size in sorted(options['sizes']):
+            with transaction.atomic():
+                self.fill(size, rng, options['batch_size'])
+                self.measure(size, options, rng)
+                transaction.set_rollback(True)
@@ -0,0 +1,57 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.storage import media_storage
+
+MEDIA_ROOT = 'recipes'
+
+
+class Command(BaseCommand):
+    help = 'deleting recipe photos and resized copies no recipe references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60,
+                            help='keep files modified in the last N minutes')
+        parser.add_argument('--dry-run', action='store_true')
+
+    @staticmethod
+    def referenced_names():
+        names = set()
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        )
+        for recipe in recipes.iterator():
+            names.add(recipe.image.name)
+            for formats in recipe.variants.values():
+                names.update(formats.values())
+        return names
+
+    @staticmethod
+    def stored_names(directory=MEDIA_ROOT):
+        if not media_storage.exists(directory):
+            return
+        directories, files = media_storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from Command.stored_names(posixpath.join(directory, name))
+
+    def handle(self, *args, **options):
+        grace = timedelta(minutes=options['grace'])
+        referenced = self.referenced_names()
+        deleted = freed = 0
+        for name in self.stored_names():
+            if name in referenced or not media_storage.is_stale(name, grace):
+                continue
+            deleted += 1
+            freed += media_storage.size(name)
+            if not options['dry_run']:
+                media_storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"[dry-run] " if options["dry_run"] else ""}'
+            f'Удалено файлов: {deleted}, освобождено {freed / 2 ** 20:.1f} МБ '
+            f'(используется файлов: {len(referenced)})'
+        ))
@@ -1,35 +1,17 @@
-import csv
-import os
-
-from django.conf import settings
-from django.core.management.base import BaseCommand, CommandError
-
+from recipes.management.bulk_load import BulkLoadCommand
 from recipes.models import Ingredient
 
-DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
 
-
-class Command(BaseCommand):
+class Command(BulkLoadCommand):
     help = 'loading ingredients from data in json or csv'
+    model = Ingredient
+    fields = ('name', 'measurement_unit')
+    default_filename = 'ingredients.csv'
+    cache_namespace = 'ingredients'
 
-    def add_arguments(self, parser):
-        parser.add_argument('filename', default='ingredients.csv', nargs='?',
-                            type=str)
-
-    def handle(self, *args, **options):
-        try:
-            with open(
-                os.path.join(DATA_ROOT, options['filename']),
-                'r', encoding='utf-8'
-            ) as f:
-                data = csv.reader(f)
-                for row in data:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-        except FileNotFoundError:
-            raise CommandError(
-                'Добавьте файл ingredients.csv в директорию data'
-            )
+    def make_object(self, row):
+        return Ingredient(
+            name=row['name'],
+            measurement_unit=row['measurement_unit'],
+            search_name=row['name'].lower(),
+        )
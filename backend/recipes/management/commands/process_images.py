@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'rendering the resized copies of recipe photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='re-render every photo, e.g. after changing the sizes',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_variants'
+        )
+        processed = 0
+        for recipe in recipes.iterator():
+            if options['all'] or not recipe.variants:
+                process_recipe_image(recipe.id, recipe.image.name)
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано фотографий: {processed}'
+        ))
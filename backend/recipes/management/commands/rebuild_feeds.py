@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from recipes import feed as timeline
+from recipes.models import FeedEntry
+from users.models import CustomUser, Following
+
+
+class Command(BaseCommand):
+    help = 'rebuilding the subscription feeds or trimming them to length'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trim', action='store_true',
+                            help='only drop entries beyond FEED_MAX_LENGTH')
+        parser.add_argument('--settle', action='store_true',
+                            help='only finish authors switched by follows')
+
+    def trim(self):
+        overflowing = FeedEntry.objects.values('user').annotate(
+            total=Count('id')
+        ).filter(total__gt=settings.FEED_MAX_LENGTH).values_list(
+            'user', flat=True
+        )
+        deleted = sum(timeline.trim(user_id) for user_id in overflowing)
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей лент: {deleted}'
+        ))
+
+    def settle(self):
+        switched, dropped = timeline.settle()
+        self.stdout.write(self.style.SUCCESS(
+            f'Авторов снова в лентах: {switched}, '
+            f'удалено записей лент: {dropped}'
+        ))
+
+    @transaction.atomic
+    def rebuild(self):
+        FeedEntry.objects.all().delete()
+        CustomUser.objects.filter(
+            followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+        ).update(feed_pulled=True)
+        CustomUser.objects.filter(
+            followers_count__lt=settings.FEED_FANOUT_MIN_FOLLOWERS
+        ).update(feed_pulled=False)
+        authors = CustomUser.objects.filter(
+            followers_count__gt=0, feed_pulled=False,
+        ).values_list('id', flat=True)
+        for following in Following.objects.filter(
+            author__in=authors
+        ).iterator():
+            timeline.follow(following.user_id, following.author_id)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны: {FeedEntry.objects.count()} записей'
+        ))
+
+    def handle(self, *args, **options):
+        if options['trim']:
+            self.trim()
+        elif options['settle']:
+            self.settle()
+        else:
+            self.rebuild()
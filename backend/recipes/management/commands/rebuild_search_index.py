@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.search import create_search_index, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'rebuilding the full-text index of recipes'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        create_search_index(connection)
+        update_search_index(connection)
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import ShoppingCart, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'rebuilding or verifying the materialized shopping lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='only report drift, do not rewrite')
+        parser.add_argument('--user', type=int, dest='user_id',
+                            help='limit to one user id')
+
+    @staticmethod
+    def expected_totals(user_id=None):
+        carts = ShoppingCart.objects.all()
+        if user_id is not None:
+            carts = carts.filter(user_id=user_id)
+        totals = carts.values_list(
+            'user', 'recipe__amounts__ingredient'
+        ).annotate(total=Sum('recipe__amounts__amount')).order_by()
+        return {
+            (user, ingredient): total
+            for user, ingredient, total in totals
+            if ingredient is not None
+        }
+
+    @staticmethod
+    def current_totals(user_id=None):
+        items = ShoppingListItem.objects.all()
+        if user_id is not None:
+            items = items.filter(user_id=user_id)
+        return {
+            (user, ingredient): total
+            for user, ingredient, total in items.values_list(
+                'user', 'ingredient', 'total_amount'
+            )
+        }
+
+    def verify(self, user_id):
+        expected = self.expected_totals(user_id)
+        current = self.current_totals(user_id)
+        drift = [
+            key for key in expected.keys() | current.keys()
+            if expected.get(key) != current.get(key)
+        ]
+        if drift:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(drift)} '
+                f'(из {len(expected)} ожидаемых позиций)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок совпадают: {len(expected)} позиций'
+        ))
+
+    @transaction.atomic
+    def rebuild(self, user_id):
+        expected = self.expected_totals(user_id)
+        items = ShoppingListItem.objects.all()
+        if user_id is not None:
+            items = items.filter(user_id=user_id)
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user,
+                    ingredient_id=ingredient,
+                    total_amount=total,
+                )
+                for (user, ingredient), total in expected.items()
+            ),
+            batch_size=500,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересобраны: {len(expected)} позиций'
+        ))
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            self.verify(options['user_id'])
+        else:
+            self.rebuild(options['user_id'])
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+
+from recipes.counters import expected_count
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import CustomUser, Following
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (CustomUser, 'recipes_count', Recipe, 'author'),
+    (CustomUser, 'followers_count', Following, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'recounting the denormalized favorite, cart and follower counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='only report drifted counters without changing them',
+        )
+
+    def handle(self, *args, **options):
+        drift = {}
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                expected = expected_count(related_model, related_field)
+                ids = list(model.objects.annotate(
+                    expected=expected
+                ).exclude(expected=F(field)).values_list('pk', flat=True))
+                if not ids:
+                    continue
+                drift[f'{model._meta.model_name}.{field}'] = len(ids)
+                if not options['verify']:
+                    model.objects.filter(pk__in=ids).update(
+                        **{field: expected}
+                    )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают'))
+            return
+        summary = ', '.join(f'{name}: {n}' for name, n in drift.items())
+        if options['verify']:
+            raise CommandError(f'Счётчики расходятся с данными: {summary}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счётчики пересчитаны: {summary}'
+        ))
@@ -0,0 +1,202 @@
+import io
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.cache import bump_version_on_commit
+from recipes import matching
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+)
+from recipes.storage import media_storage
+from tags.models import Tag
+from users.models import CustomUser, Following
+
+USERNAME_PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'seeding a synthetic dataset for bench_api with bulk inserts; '
+        'users are named bench_<n> and share one password'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='subscriptions per user')
+        parser.add_argument('--favorites', type=int, default=50,
+                            help='favorites per user')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='shopping cart entries per user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true',
+                            help='remove an earlier bench dataset first')
+
+    @staticmethod
+    def placeholder_image():
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), 'orange').save(buffer, 'JPEG')
+        return media_storage.save(
+            'recipes/bench.jpg', ContentFile(buffer.getvalue())
+        )
+
+    @staticmethod
+    def pairs(rng, left, right, per_left, exclude_self=False):
+        per_left = min(per_left, len(right) - exclude_self)
+        for item in left:
+            chosen = set()
+            while len(chosen) < per_left:
+                other = rng.choice(right)
+                if not (exclude_self and other == item):
+                    chosen.add(other)
+            yield from ((item, other) for other in chosen)
+
+    @staticmethod
+    def last_id(model):
+        return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        last_id = self.last_id(CustomUser)
+        offset = CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        CustomUser.objects.bulk_create(
+            (
+                CustomUser(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=f'{USERNAME_PREFIX}{number}@example.com',
+                    first_name='Тест',
+                    last_name=f'Пользователь {number}',
+                    password=password,
+                )
+                for number in range(offset, offset + count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        users = list(CustomUser.objects.filter(
+            id__gt=last_id
+        ).values_list('id', flat=True))
+        Token.objects.bulk_create(
+            (Token(key=Token.generate_key(), user_id=user) for user in users),
+            batch_size=BATCH_SIZE,
+        )
+        return users
+
+    def create_recipes(self, rng, users, count, tags, ingredients, per_recipe):
+        image = self.placeholder_image()
+        last_id = self.last_id(Recipe)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=rng.choice(users),
+                    name=f'Рецепт {number}',
+                    text='Нарезать, смешать, приготовить. ' * 10,
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                )
+                for number in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ids = list(Recipe.objects.filter(
+            id__gt=last_id
+        ).values_list('id', flat=True))
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            (
+                through(recipe_id=recipe, tag_id=tag)
+                for recipe in ids
+                for tag in rng.sample(tags, min(len(tags), rng.randint(1, 3)))
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe_id=recipe,
+                    ingredient_id=ingredient,
+                    amount=rng.randint(1, 500),
+                )
+                for recipe in ids
+                for ingredient in rng.sample(ingredients, per_recipe)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return ids
+
+    def clear(self):
+        users = CustomUser.objects.filter(username__startswith=USERNAME_PREFIX)
+        Recipe.objects.filter(author__in=users).delete()
+        deleted, _ = users.delete()
+        self.stdout.write(f'Удалено объектов прежнего набора: {deleted}')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        tags = list(Tag.objects.values_list('id', flat=True))
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if not tags or len(ingredients) < options['ingredients_per_recipe']:
+            raise CommandError('Сначала загрузите теги и ингредиенты')
+        if options['clear']:
+            self.clear()
+        users = self.create_users(options['users'])
+        recipes = self.create_recipes(
+            rng, users, options['recipes'], tags, ingredients,
+            options['ingredients_per_recipe'],
+        )
+        Following.objects.bulk_create(
+            (
+                Following(user_id=user, author_id=author)
+                for user, author in self.pairs(
+                    rng, users, users, options['follows'], exclude_self=True
+                )
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        for model, per_user in (
+            (Favorite, options['favorites']),
+            (ShoppingCart, options['cart']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user_id=user, recipe_id=recipe)
+                    for user, recipe in self.pairs(
+                        rng, users, recipes, per_user
+                    )
+                ),
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+        # bulk_create skips the signals that maintain derived data.
+        for command in (
+            'reconcile_counters',
+            'rebuild_shopping_lists',
+            'update_trending',
+            'rebuild_search_index',
+            'rebuild_feeds',
+        ):
+            call_command(command, stdout=io.StringIO())
+        matching.invalidate()
+        bump_version_on_commit('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)}; '
+            f'пароль пользователей: {PASSWORD}'
+        ))
@@ -0,0 +1,109 @@
+import io
+import threading
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from recipes.management.commands.bench_api import (
+    HTTPTransport,
+    LocalTransport,
+)
+from recipes.management.commands.seed_bench_data import USERNAME_PREFIX
+from recipes.models import Recipe
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        'sending the same favorite, cart and subscribe write from many '
+        'threads at once and checking that exactly one succeeds'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--base-url',
+                            help='hammer a running server instead')
+
+    def transport(self, token, options):
+        if options['base_url']:
+            return HTTPTransport(token, options['base_url'])
+        return LocalTransport(token)
+
+    def hammer(self, transports, method, path):
+        """Send method path from every transport at the same moment."""
+        barrier = threading.Barrier(len(transports))
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def send(transport):
+            barrier.wait()
+            try:
+                status_code, _ = transport.request(method, path)
+            except Exception as error:
+                status_code = type(error).__name__
+            with lock:
+                statuses[status_code] += 1
+
+        threads = [
+            threading.Thread(target=send, args=(transport,))
+            for transport in transports
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def report(self, name, statuses, success):
+        expected = Counter({success: 1, 400: sum(statuses.values()) - 1})
+        verdict = 'OK' if statuses == expected else 'СБОЙ'
+        self.stdout.write(f'{name:<32}{dict(statuses)}  {verdict}')
+        return statuses == expected
+
+    def targets(self, user):
+        recipe = Recipe.objects.exclude(author=user).order_by('?').first()
+        author = CustomUser.objects.exclude(pk=user.pk).filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('?').first()
+        if recipe is None or author is None:
+            raise CommandError('Сначала выполните seed_bench_data')
+        return (
+            ('favorite', f'/api/recipes/{recipe.id}/favorite/'),
+            ('shopping_cart', f'/api/recipes/{recipe.id}/shopping_cart/'),
+            ('subscribe', f'/api/users/{author.id}/subscribe/'),
+        )
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('Сначала выполните seed_bench_data')
+        token, _ = Token.objects.get_or_create(user=user)
+        transports = [
+            self.transport(token.key, options)
+            for _ in range(options['threads'])
+        ]
+        passed = True
+        for _ in range(options['rounds']):
+            for name, path in self.targets(user):
+                # Start from a known state: the row must be absent.
+                transports[0].request('DELETE', path)
+                passed &= self.report(
+                    f'POST {name}', self.hammer(transports, 'POST', path),
+                    201,
+                )
+                passed &= self.report(
+                    f'DELETE {name}',
+                    self.hammer(transports, 'DELETE', path), 204,
+                )
+        for command in ('reconcile_counters', 'rebuild_shopping_lists'):
+            call_command(command, '--verify', stdout=io.StringIO())
+        if not passed:
+            raise CommandError('Конкурентные запросы обработаны неверно')
+        self.stdout.write(self.style.SUCCESS(
+            'Конкурентные запросы обработаны верно, счётчики сходятся'
+        ))
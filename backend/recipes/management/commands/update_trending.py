@@ -0,0 +1,69 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from api.cache import bump_version_on_commit
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+ACTIVITY_WEIGHTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 0.5),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'recomputing the time-decayed trending score of recipes from '
+        'recent favorite and shopping cart activity'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--half-life', type=float,
+                            default=settings.TRENDING_HALF_LIFE_HOURS,
+                            help='score half-life in hours')
+        parser.add_argument('--window', type=int,
+                            default=settings.TRENDING_WINDOW_DAYS,
+                            help='ignore activity older than this many days')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    @staticmethod
+    def scores(now, half_life, window):
+        """Sum hourly activity buckets, each decayed by its age."""
+        scores = defaultdict(float)
+        for model, weight in ACTIVITY_WEIGHTS:
+            buckets = model.objects.filter(
+                added__gte=now - timedelta(days=window)
+            ).annotate(hour=TruncHour('added')).values(
+                'recipe', 'hour'
+            ).annotate(events=Count('pk')).order_by()
+            for bucket in buckets:
+                age = (now - bucket['hour']).total_seconds() / 3600
+                scores[bucket['recipe']] += (
+                    weight * bucket['events'] * math.pow(0.5, age / half_life)
+                )
+        return scores
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        scores = self.scores(
+            timezone.now(), options['half_life'], options['window']
+        )
+        Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+        recipes = [
+            Recipe(pk=pk, trending_score=round(score, 6))
+            for pk, score in scores.items()
+        ]
+        Recipe.objects.bulk_update(
+            recipes, ('trending_score',), batch_size=options['batch_size']
+        )
+        bump_version_on_commit('recipes')
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлён для рецептов: {len(recipes)}'
+        ))
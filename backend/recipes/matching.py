@@ -0,0 +1,233 @@
+"""Ingredient-set matching for "what can I cook".
+
+An inverted index maps every ingredient to the sorted ids of the recipes
+using it, kept as compact integer arrays. It is built from one ordered scan
+of IngredientAmount and then lives in the process. Recipe changes are
+appended to a log in the shared cache, and every process reloads just the
+amounts of the logged recipes; a full rebuild, when the log cannot be
+followed, runs in a background thread while the old index keeps answering.
+"""
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+from django.db import connections, transaction
+
+from api.cache import bump_version, get_cache, get_version
+from recipes.models import IngredientAmount
+
+INDEX_NAMESPACE = 'ingredient_index'
+CHANGES_NAMESPACE = 'ingredient_index_changes'
+CHANGE_LOG_TIMEOUT = 24 * 60 * 60
+MAX_PENDING_CHANGES = 1000
+MATCH_RESULT_LIMIT = 1000
+MAX_QUERY_INGREDIENTS = 50
+
+_lock = threading.Lock()
+_index = None
+_rebuilding = False
+
+
+class IngredientIndex:
+    """Immutable once built: updates produce a new index to swap in."""
+
+    def __init__(self, version, changes, postings, recipes):
+        self.version = version
+        self.changes = changes
+        # ingredient id -> sorted recipe ids, recipe id -> ingredient ids.
+        self.postings = postings
+        self.recipes = recipes
+
+    @classmethod
+    def from_rows(cls, version, changes, rows):
+        """rows are (ingredient_id, recipe_id) pairs in that sort order."""
+        postings = {}
+        recipes = {}
+        for ingredient_id, recipe_id in rows:
+            posting = postings.get(ingredient_id)
+            if posting is None:
+                posting = postings[ingredient_id] = array('q')
+            posting.append(recipe_id)
+            ingredients = recipes.get(recipe_id)
+            if ingredients is None:
+                ingredients = recipes[recipe_id] = array('q')
+            ingredients.append(ingredient_id)
+        return cls(version, changes, postings, recipes)
+
+    def updated(self, changes, amounts):
+        """A copy in which the recipes of amounts use the given ingredients.
+
+        amounts maps recipe ids to ingredient ids, empty for deleted
+        recipes. Only the touched posting lists are copied.
+        """
+        postings = dict(self.postings)
+        recipes = dict(self.recipes)
+        touched = {}
+
+        def posting(ingredient_id):
+            if ingredient_id not in touched:
+                touched[ingredient_id] = postings[ingredient_id] = array(
+                    'q', self.postings.get(ingredient_id, ())
+                )
+            return touched[ingredient_id]
+
+        for recipe_id, ingredient_ids in amounts.items():
+            for ingredient_id in recipes.pop(recipe_id, ()):
+                ids = posting(ingredient_id)
+                del ids[bisect_left(ids, recipe_id)]
+            for ingredient_id in ingredient_ids:
+                ids = posting(ingredient_id)
+                ids.insert(bisect_left(ids, recipe_id), recipe_id)
+            if ingredient_ids:
+                recipes[recipe_id] = array('q', ingredient_ids)
+        for ingredient_id, ids in touched.items():
+            if not ids:
+                del postings[ingredient_id]
+        return IngredientIndex(self.version, changes, postings, recipes)
+
+    def match(self, ingredient_ids, max_missing=None, limit=None):
+        """Recipes using any of ingredient_ids, best coverage first.
+
+        Returns (recipe_id, matched, missing) tuples ordered by the number
+        of missing ingredients, then by the number of matched ones, newest
+        recipe first. Only the posting lists of the asked ingredients are
+        read, so the cost does not depend on the size of the catalog.
+        """
+        matched = Counter(chain.from_iterable(
+            self.postings[ingredient_id]
+            for ingredient_id in set(ingredient_ids)
+            if ingredient_id in self.postings
+        ))
+        ranked = (
+            (recipe_id, count, len(self.recipes[recipe_id]) - count)
+            for recipe_id, count in matched.items()
+        )
+        if max_missing is not None:
+            ranked = (row for row in ranked if row[2] <= max_missing)
+
+        def coverage(row):
+            return row[2], -row[1], -row[0]
+
+        if limit is None:
+            return sorted(ranked, key=coverage)
+        return heapq.nsmallest(limit, ranked, key=coverage)
+
+
+def build_index(version, changes):
+    return IngredientIndex.from_rows(
+        version,
+        changes,
+        IngredientAmount.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator(),
+    )
+
+
+def load_amounts(recipe_ids):
+    amounts = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id in IngredientAmount.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        amounts[recipe_id].append(ingredient_id)
+    return amounts
+
+
+def change_key(number):
+    return f'{CHANGES_NAMESPACE}:{number}'
+
+
+def pending_recipes(index, changes):
+    """Recipe ids logged after index was built, None if the log has gaps."""
+    if not 0 < changes - index.changes <= MAX_PENDING_CHANGES:
+        return None
+    keys = [
+        change_key(number)
+        for number in range(index.changes + 1, changes + 1)
+    ]
+    logged = get_cache().get_many(keys)
+    if len(logged) < len(keys):
+        return None
+    return set(chain.from_iterable(logged.values()))
+
+
+def rebuild():
+    global _index, _rebuilding
+    try:
+        index = build_index(
+            get_version(INDEX_NAMESPACE), get_version(CHANGES_NAMESPACE)
+        )
+        with _lock:
+            _index = index
+    finally:
+        _rebuilding = False
+        connections.close_all()
+
+
+def start_rebuild():
+    """Rebuild in a background thread unless one runs; hold _lock."""
+    global _rebuilding
+    if not _rebuilding:
+        _rebuilding = True
+        threading.Thread(
+            target=rebuild, name='ingredient-index', daemon=True
+        ).start()
+
+
+def get_index():
+    """The index of this process, caught up with the change log.
+
+    Only the first call in a process builds the index inline; later ones
+    reload the amounts of logged recipes or, if the log was lost or a full
+    rebuild was asked for, keep answering from the current index.
+    """
+    global _index
+    version = get_version(INDEX_NAMESPACE)
+    changes = get_version(CHANGES_NAMESPACE)
+    index = _index
+    if (
+        index is not None
+        and index.version == version
+        and index.changes == changes
+    ):
+        return index
+    with _lock:
+        if _index is None:
+            _index = build_index(version, changes)
+        elif _index.version != version:
+            start_rebuild()
+        elif _index.changes != changes:
+            recipe_ids = pending_recipes(_index, changes)
+            if recipe_ids is None:
+                start_rebuild()
+            else:
+                _index = _index.updated(changes, load_amounts(recipe_ids))
+        return _index
+
+
+def log_changes(recipe_ids):
+    cache = get_cache()
+    get_version(CHANGES_NAMESPACE)
+    try:
+        number = cache.incr(f'{CHANGES_NAMESPACE}:version')
+    except ValueError:
+        # The counter was evicted: its fresh value makes everyone rebuild.
+        get_version(CHANGES_NAMESPACE)
+        return
+    # A reader seeing the number before this entry rebuilds in full.
+    cache.set(change_key(number), recipe_ids, timeout=CHANGE_LOG_TIMEOUT)
+
+
+def invalidate(recipe_ids=None):
+    """Update the index everywhere once the current transaction commits.
+
+    With recipe_ids only those recipes are reloaded; without, every
+    process rebuilds the whole index in the background.
+    """
+    if recipe_ids is None:
+        transaction.on_commit(lambda: bump_version(INDEX_NAMESPACE))
+        return
+    recipe_ids = list(recipe_ids)
+    transaction.on_commit(lambda: log_changes(recipe_ids))
@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1).order_by()
+    if not groups:
+        return
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep'])
+        amounts = IngredientAmount.objects.filter(ingredient__in=duplicates)
+        for amount in amounts:
+            # A recipe listing several duplicates gets their sum.
+            kept = IngredientAmount.objects.filter(
+                recipe_id=amount.recipe_id, ingredient_id=group['keep']
+            ).first()
+            if kept is None:
+                amount.ingredient_id = group['keep']
+                amount.save(update_fields=('ingredient',))
+            else:
+                kept.amount += amount.amount
+                kept.save(update_fields=('amount',))
+                amount.delete()
+        duplicates.delete()
+    ShoppingListItem.objects.all().delete()
+    totals = ShoppingCart.objects.values_list(
+        'user', 'recipe__amounts__ingredient'
+    ).annotate(total=models.Sum('recipe__amounts__amount')).order_by()
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=total,
+            )
+            for user_id, ingredient_id, total in totals
+            if ingredient_id is not None
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_search_name'),
+    ]
+
+    # The unique constraint is added by 0015: on PostgreSQL an ALTER TABLE
+    # in the transaction that deleted referenced rows fails with pending
+    # trigger events.
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
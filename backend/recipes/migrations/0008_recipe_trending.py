@@ -0,0 +1,53 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_added(apps, schema_editor):
+    """Date old rows by their recipe, not by the migration run.
+
+    With now() every old favorite would count as recent for trending.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    pub_date = Recipe.objects.filter(
+        pk=models.OuterRef('recipe_id')
+    ).values('pub_date')
+    for name in ('Favorite', 'ShoppingCart'):
+        apps.get_model('recipes', name).objects.update(
+            added=models.Subquery(pub_date)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False, help_text='Пересчитывается командой update_trending', verbose_name='Рейтинг популярности'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(fill_added, migrations.RunPython.noop),
+    ]
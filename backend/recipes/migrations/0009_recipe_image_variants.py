@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Уменьшенные копии фотографии'),
+        ),
+    ]
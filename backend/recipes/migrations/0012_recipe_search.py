@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:00
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# A copy of the SQL in recipes.search as of this migration, so later
+# changes to that module do not change what this migration does.
+FTS_TABLE = 'recipes_recipe_fts'
+INGREDIENT_NAMES_SQL = (
+    "SELECT {aggregate} FROM recipes_ingredientamount amount "
+    "JOIN recipes_ingredient ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id"
+)
+POSTGRESQL_UPDATE_SQL = (
+    "UPDATE recipes_recipe recipe SET search_vector = "
+    "setweight(to_tsvector('russian', recipe.name), 'A') || "
+    "setweight(to_tsvector('russian', recipe.text), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    + INGREDIENT_NAMES_SQL.format(
+        aggregate="string_agg(ingredient.name, ' ')"
+    )
+    + "), '')), 'C')"
+)
+SQLITE_INSERT_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) "
+    "SELECT recipe.id, recipe.name, recipe.text, coalesce(("
+    + INGREDIENT_NAMES_SQL.format(
+        aggregate="group_concat(ingredient.name, ' ')"
+    )
+    + "), '') FROM recipes_recipe recipe"
+)
+
+
+def build_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+                'ON recipes_recipe USING gin (search_vector)'
+            )
+            cursor.execute(POSTGRESQL_UPDATE_SQL)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                'name, text, ingredients, '
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(SQLITE_INSERT_SQL)
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый индекс'),
+        ),
+        migrations.RunPython(build_search_index, remove_search_index),
+    ]
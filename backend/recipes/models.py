@@ -1,8 +1,40 @@
+import json
+
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models.expressions import Window
+from django.db.models.functions import RowNumber
 
+from recipes import search as full_text
+from recipes.storage import media_storage
 from tags.models import Tag
-from users.models import CustomUser
+from users.models import CustomUser, Following
+
+
+class IngredientQuerySet(models.QuerySet):
+
+    def name_startswith(self, prefix):
+        prefix = prefix.lower()
+        if connections[self.db].vendor == 'postgresql':
+            return self.filter(search_name__startswith=prefix)
+        # LIKE with ESCAPE never uses an index in SQLite, a range does.
+        return self.filter(
+            search_name__gte=prefix,
+            search_name__lt=prefix + chr(0x10ffff),
+        )
+
+    def autocomplete(self, query, limit):
+        """Prefix matches first, then substring matches, at most limit."""
+        query = query.strip().lower()
+        found = list(
+            self.name_startswith(query).order_by('search_name')[:limit]
+        )
+        if query and len(found) < limit:
+            found += self.filter(search_name__contains=query).exclude(
+                pk__in=[ingredient.pk for ingredient in found]
+            ).order_by('search_name')[:limit - len(found)]
+        return found
 
 
 class Ingredient(models.Model):
@@ -16,14 +48,139 @@ class Ingredient(models.Model):
         verbose_name='Название единицы измерения',
         help_text='Введите название единицы измерения',
     )
+    search_name = models.CharField(
+        max_length=250,
+        db_index=True,
+        editable=False,
+        verbose_name='Название для поиска',
+    )
+
+    objects = IngredientQuerySet.as_manager()
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=(
+                    'name',
+                    'measurement_unit',
+                ),
+                name='unique_ingredient',
+            ),
+        )
         verbose_name = 'Ингредиенты'
         verbose_name_plural = 'Ингредиенты'
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
+    def save(self, *args, **kwargs):
+        self.search_name = self.name.lower()
+        super().save(*args, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    @staticmethod
+    def user_flag(name, user):
+        """Exists() over the favorites or the cart of user for the row."""
+        model = {
+            'is_favorited': Favorite,
+            'is_in_shopping_cart': ShoppingCart,
+        }[name]
+        return models.Exists(model.objects.filter(
+            user=user, recipe=models.OuterRef('pk')
+        ))
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=self.user_flag('is_favorited', user),
+            is_in_shopping_cart=self.user_flag('is_in_shopping_cart', user),
+        )
+
+    def filter_user_flag(self, name, user, value):
+        """Keep recipes whose is_favorited/is_in_shopping_cart equals value.
+
+        Compiles to a semi-join (EXISTS) or an anti-join (NOT EXISTS) on
+        the (user, recipe) unique index; other filters stay applied.
+        """
+        if not user.is_authenticated:
+            return self.none() if value else self
+        queryset = self
+        if name not in self.query.annotations:
+            queryset = self.annotate(**{name: self.user_flag(name, user)})
+        return queryset.filter(**{name: value})
+
+    def search(self, text):
+        """Full-text matches ranked by relevance, as search_rank."""
+        return full_text.search(self, connections[self.db], text)
+
+    def update_search_index(self):
+        full_text.update_search_index(
+            connections[self.db], self.values_list('pk', flat=True)
+        )
+
+    def with_tags(self, tags):
+        """Recipes having any of tags, via a subquery instead of a join."""
+        return self.filter(pk__in=Recipe.tags.through.objects.filter(
+            tag__in=tags
+        ).values('recipe_id'))
+
+    def with_related(self, user):
+        """Queryset for recipe reads: a fixed number of queries per page."""
+        if user.is_authenticated:
+            is_subscribed = models.Exists(Following.objects.filter(
+                user=user, author=models.OuterRef('pk')
+            ))
+        else:
+            is_subscribed = models.Value(
+                False, output_field=models.BooleanField()
+            )
+        return self.with_user_flags(user).prefetch_related(
+            models.Prefetch(
+                'author',
+                queryset=CustomUser.objects.annotate(
+                    is_subscribed=is_subscribed
+                ),
+            ),
+            'tags',
+            models.Prefetch(
+                'amounts',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """Each author's newest recipes, at most limit per author.
+
+        ROW_NUMBER() cannot be filtered on in the ORM, so the windowed
+        query is wrapped in a raw one; it is still a single query.
+        """
+        recipes = self.filter(author_id__in=author_ids)
+        if limit is None or not author_ids:
+            return recipes
+        ranked = recipes.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[models.F('author_id')],
+            order_by=[models.F('pub_date').desc(), models.F('id').desc()],
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+            'ORDER BY pub_date DESC, id DESC',
+            (*params, limit),
+        )
+
 
 class Recipe(models.Model):
     author = models.ForeignKey(
@@ -40,6 +197,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=media_storage,
+        db_index=True,
         verbose_name='Фотография блюда',
         help_text='Добавьте фотографию блюда',
     )
@@ -76,6 +235,10 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     slug = models.SlugField(
         unique=True,
         blank=True,
@@ -83,15 +246,72 @@ class Recipe(models.Model):
         verbose_name='Ссылка',
         help_text='Введите ссылку',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+    trending_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Рейтинг популярности',
+        help_text='Пересчитывается командой update_trending',
+    )
+    image_variants = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Уменьшенные копии фотографии',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый индекс',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx',
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending_idx',
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    @property
+    def variants(self):
+        """Processed copies of the current image, {} until they are ready."""
+        if not self.image_variants:
+            return {}
+        data = json.loads(self.image_variants)
+        if data['source'] != self.image.name:
+            return {}
+        return data['variants']
+
 
 class IngredientAmount(models.Model):
     ingredient = models.ForeignKey(
@@ -142,6 +362,11 @@ class Favorite(models.Model):
         verbose_name='Избранные рецепты у пользователей',
         help_text='Избранные рецепты у пользователей',
     )
+    added = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         constraints = (
@@ -175,6 +400,11 @@ class ShoppingCart(models.Model):
         verbose_name='Корзина покупок',
         help_text='Ингредиенты в списке покупок пользователя',
     )
+    added = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         constraints = (
@@ -191,3 +421,165 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} added {self.recipe} to shopping cart'
+
+
+class ShoppingListItemQuerySet(models.QuerySet):
+    """Incremental maintenance of the per-user ingredient totals."""
+
+    @staticmethod
+    def recipe_amounts(recipe_ids):
+        return dict(
+            IngredientAmount.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('ingredient').annotate(
+                total=models.Sum('amount')
+            ).order_by()
+        )
+
+    def apply_deltas(self, user_ids, deltas):
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        if not user_ids or not deltas:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [
+                    self.model(user_id=user_id, ingredient_id=ingredient_id)
+                    for user_id in user_ids
+                    for ingredient_id, delta in deltas.items() if delta > 0
+                ],
+                ignore_conflicts=True,
+            )
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            )
+            items.update(total_amount=models.F('total_amount') + models.Case(
+                *(
+                    models.When(ingredient_id=ingredient_id, then=delta)
+                    for ingredient_id, delta in deltas.items()
+                ),
+                default=0,
+                output_field=models.IntegerField(),
+            ))
+            items.filter(total_amount__lte=0).delete()
+
+    def add_recipes(self, user_id, recipe_ids):
+        self.apply_deltas([user_id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        self.apply_deltas([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.recipe_amounts(
+                recipe_ids
+            ).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        deltas = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        if not any(deltas.values()):
+            return
+        user_ids = list(ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', flat=True))
+        self.apply_deltas(user_ids, deltas)
+
+    def drop_recipe(self, recipe):
+        self.change_recipe(recipe, self.recipe_amounts([recipe.id]), {})
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество',
+    )
+
+    objects = ShoppingListItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=(
+                    'user',
+                    'ingredient',
+                ),
+                name='unique_shopping_list_item',
+            ),
+        )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    """A recipe in the feed of one follower of its author.
+
+    Written when the recipe is published (fan-out on write), so reading a
+    feed is a range scan of one user's entries. pub_date and author are
+    copies from the recipe: the first orders the feed, the second lets an
+    unsubscription drop the author's entries.
+    """
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=(
+                    'user',
+                    'recipe',
+                ),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_pub_date_idx',
+            ),
+        )
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe}'
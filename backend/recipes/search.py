@@ -0,0 +1,146 @@
+"""Full-text recipe search.
+
+PostgreSQL keeps a weighted tsvector in Recipe.search_vector behind a GIN
+index; SQLite keeps the same three columns in an FTS5 table keyed by the
+recipe id. Both are written with raw SQL; migration 0012 keeps its own
+copy of it.
+"""
+import re
+
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULT_LIMIT = 200
+FTS_TABLE = 'recipes_recipe_fts'
+# bm25() weights of the name, text and ingredients columns.
+FTS_WEIGHTS = (10.0, 4.0, 1.0)
+ID_CHUNK_SIZE = 500
+
+INGREDIENT_NAMES_SQL = (
+    "SELECT {aggregate} FROM recipes_ingredientamount amount "
+    "JOIN recipes_ingredient ingredient "
+    "ON ingredient.id = amount.ingredient_id "
+    "WHERE amount.recipe_id = recipe.id"
+)
+POSTGRESQL_UPDATE_SQL = (
+    "UPDATE recipes_recipe recipe SET search_vector = "
+    "setweight(to_tsvector(%(config)s, recipe.name), 'A') || "
+    "setweight(to_tsvector(%(config)s, recipe.text), 'B') || "
+    "setweight(to_tsvector(%(config)s, coalesce(("
+    + INGREDIENT_NAMES_SQL.format(
+        aggregate="string_agg(ingredient.name, ' ')"
+    )
+    + "), '')), 'C')"
+)
+SQLITE_INSERT_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) "
+    "SELECT recipe.id, recipe.name, recipe.text, coalesce(("
+    + INGREDIENT_NAMES_SQL.format(
+        aggregate="group_concat(ingredient.name, ' ')"
+    )
+    + "), '') FROM recipes_recipe recipe"
+)
+
+
+def create_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+                'ON recipes_recipe USING gin (search_vector)'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+                'name, text, ingredients, '
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def chunks(ids):
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        yield ids[start:start + ID_CHUNK_SIZE]
+
+
+def update_search_index(connection, recipe_ids=None):
+    """Reindex the given recipes, or every recipe when ids are omitted."""
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            params = {'config': SEARCH_CONFIG, 'ids': recipe_ids}
+            if recipe_ids is None:
+                cursor.execute(POSTGRESQL_UPDATE_SQL, params)
+            else:
+                cursor.execute(
+                    POSTGRESQL_UPDATE_SQL + ' WHERE recipe.id = ANY(%(ids)s)',
+                    params,
+                )
+        elif connection.vendor == 'sqlite':
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(SQLITE_INSERT_SQL)
+                return
+            for chunk in chunks(recipe_ids):
+                placeholders = ', '.join('%s' for _ in chunk)
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                    chunk,
+                )
+                cursor.execute(
+                    f'{SQLITE_INSERT_SQL} WHERE recipe.id IN ({placeholders})',
+                    chunk,
+                )
+
+
+def search_postgresql(queryset, text):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(text, config=SEARCH_CONFIG)
+    return queryset.annotate(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).filter(search_vector=query).order_by('-search_rank', '-id')
+
+
+def search_sqlite(queryset, connection, text):
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return queryset.none()
+    match = ' '.join(f'"{term}"*' for term in terms)
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s ORDER BY 2 LIMIT %s',
+            (match, SEARCH_RESULT_LIMIT),
+        )
+        ranks = cursor.fetchall()
+    if not ranks:
+        return queryset.none()
+    # bm25() is lower for better matches.
+    return queryset.filter(pk__in=[pk for pk, _ in ranks]).annotate(
+        search_rank=Case(
+            *(When(pk=pk, then=Value(-rank)) for pk, rank in ranks),
+            output_field=FloatField(),
+        )
+    ).order_by('-search_rank', '-id')
+
+
+def search(queryset, connection, text):
+    if connection.vendor == 'postgresql':
+        return search_postgresql(queryset, text)
+    if connection.vendor == 'sqlite':
+        return search_sqlite(queryset, connection, text)
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
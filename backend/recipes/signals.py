@@ -0,0 +1,121 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from api.cache import bump_version_on_commit
+from api.user_state import invalidate_user_state
+from recipes.counters import change_counter
+from recipes import feed as timeline, matching
+from recipes.images import release_image, schedule_variants
+from recipes.models import (
+    Favorite, Ingredient, Recipe, ShoppingCart, ShoppingListItem
+)
+from users.models import CustomUser
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, signal, **kwargs):
+    bump_version_on_commit('ingredients')
+    bump_version_on_commit('recipes')
+    if signal is post_delete:
+        matching.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            amounts__ingredient=instance
+        ).update_search_index()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(CustomUser, instance.author_id, 'recipes_count', 1)
+        transaction.on_commit(lambda: timeline.publish(instance))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipes(sender, **kwargs):
+    bump_version_on_commit('recipes')
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_recipe_image(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    instance.replaced_image = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first()
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_decoded_image(sender, instance, **kwargs):
+    # An upload not stored yet may carry the image CleanImageField decoded.
+    image = instance.image
+    instance.decoded_image = getattr(
+        image.file if image and not image._committed else None,
+        'decoded', None,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, **kwargs):
+    replaced = getattr(instance, 'replaced_image', None)
+    if replaced and replaced != instance.image.name:
+        transaction.on_commit(lambda: release_image(replaced))
+    if instance.image and not instance.variants:
+        schedule_variants(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def drop_recipe_from_shopping_lists(sender, instance, **kwargs):
+    # IngredientAmount has no delete receivers, so the cascade removes its
+    # rows in one query before any post_delete: the amounts are read here
+    # while they exist, and shopping_cart_deleted then subtracts nothing.
+    ShoppingListItem.objects.drop_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(CustomUser, instance.author_id, 'recipes_count', -1)
+    matching.invalidate([instance.pk])
+    name = instance.image.name
+    transaction.on_commit(lambda: release_image(name))
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+        invalidate_user_state(instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+    invalidate_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'cart_count', 1)
+        ShoppingListItem.objects.add_recipes(
+            instance.user_id, [instance.recipe_id]
+        )
+        invalidate_user_state(instance.user_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'cart_count', -1)
+    ShoppingListItem.objects.remove_recipes(
+        instance.user_id, [instance.recipe_id]
+    )
+    invalidate_user_state(instance.user_id)
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files after the sha256 of their bytes.
+
+    Saving bytes that are already stored returns the existing name without
+    writing anything, so identical uploads share one file.
+    """
+
+    @staticmethod
+    def content_hash(content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return digest.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        digest = self.content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(
+            posixpath.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            # A fresh reference must not be collected as an orphan.
+            os.utime(self.path(name))
+            return name
+        temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def is_stale(self, name, grace):
+        return self.get_modified_time(name) < timezone.now() - grace
+
+
+media_storage = ContentAddressedStorage()
@@ -1,10 +1,12 @@
 from rest_framework import viewsets
 
+from api.cache import CachedListMixin
 from tags.models import Tag
 from tags.serializers import TagSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
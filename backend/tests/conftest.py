@@ -0,0 +1,121 @@
+import pytest
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import local_tokens
+from api.cache import get_cache
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingCart,
+)
+from tags.models import Tag
+from users.models import CustomUser, Following
+
+RECIPES_COUNT = 12
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    get_cache().clear()
+    local_tokens.clear()
+    yield
+    get_cache().clear()
+    local_tokens.clear()
+
+
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    """A cache backend all processes would see, unlike the default one."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path),
+        }
+    }
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        email=f'{username}@foodgram.test',
+        username=username,
+        first_name=username,
+        last_name=username,
+        password='password',
+    )
+
+
+@pytest.fixture
+def make_user(db):
+    return create_user
+
+
+@pytest.fixture
+def author(db):
+    return create_user('author')
+
+
+@pytest.fixture
+def user(db):
+    return create_user('user')
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+@pytest.fixture
+def tags(db):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}', color=f'#00000{number}',
+            slug=f'tag-{number}',
+        )
+        for number in range(3)
+    ]
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(5)
+    ]
+
+
+@pytest.fixture
+def recipes(author, user, tags, ingredients):
+    """Recipes of author, some favorited and in the cart of user."""
+    recipes = []
+    for number in range(RECIPES_COUNT):
+        recipe = Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            text='Описание',
+            cooking_time=10,
+            image=f'recipes/{number}.jpg',
+        )
+        recipe.tags.set(tags[:2])
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient, amount=10)
+            for ingredient in ingredients[:3]
+        )
+        recipes.append(recipe)
+    for recipe in recipes[::2]:
+        Favorite.objects.create(user=user, recipe=recipe)
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+    Following.objects.create(user=user, author=author)
+    return recipes
@@ -0,0 +1,36 @@
+"""Admin search finds recipes by their text and by their author."""
+import pytest
+from django.contrib import admin
+
+from recipes.models import Recipe
+
+
+@pytest.fixture
+def search(recipes):
+    model_admin = admin.site._registry[Recipe]
+
+    def run(term):
+        queryset, _ = model_admin.get_search_results(
+            None, Recipe.objects.all(), term
+        )
+        return set(queryset)
+    return run
+
+
+def test_search_by_name(search, recipes):
+    recipes[3].name = 'Борщ'
+    recipes[3].save()
+    Recipe.objects.filter(pk=recipes[3].pk).update_search_index()
+    assert search('борщ') == {recipes[3]}
+
+
+def test_search_by_author(search, make_user, recipes):
+    other = Recipe.objects.create(
+        author=make_user('other'),
+        name='Салат',
+        text='Описание',
+        cooking_time=5,
+        image='recipes/other.jpg',
+    )
+    assert search('other@foodgram') == {other}
+    assert search('author') == set(recipes)
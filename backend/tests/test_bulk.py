@@ -0,0 +1,64 @@
+"""Batch changes count only the rows they write themselves."""
+from django.core.management import call_command
+
+from recipes import bulk
+from recipes.models import Recipe, ShoppingCart
+
+
+def test_single_add_meanwhile(monkeypatch, make_user, recipes):
+    buyer = make_user('buyer')
+    insert_new = bulk.insert_new
+
+    def single_add_first(model, user, recipe_ids):
+        # Another request adds one of them after add() read the cart.
+        ShoppingCart.objects.create(user=user, recipe=recipes[1])
+        return insert_new(model, user, recipe_ids)
+
+    monkeypatch.setattr(bulk, 'insert_new', single_add_first)
+    results = bulk.add(ShoppingCart, buyer, [recipes[0].pk, recipes[1].pk])
+    assert results == [
+        {'id': recipes[0].pk, 'status': bulk.ADDED},
+        {'id': recipes[1].pk, 'status': bulk.EXISTS},
+    ]
+    recipes[1].refresh_from_db()
+    assert recipes[1].cart_count == 1
+    call_command('rebuild_shopping_lists', '--verify')
+
+
+def test_add_applies_delta(make_user, recipes):
+    buyer = make_user('buyer')
+    Recipe.objects.filter(pk=recipes[1].pk).update(cart_count=5)
+    bulk.add(ShoppingCart, buyer, [recipes[1].pk])
+    recipes[1].refresh_from_db()
+    assert recipes[1].cart_count == 6
+
+
+def test_remove_counts_only_deleted_rows(monkeypatch, user, recipes):
+    delete_returning = bulk.delete_returning
+
+    def single_delete_first(model, user, field, values=None):
+        # Another request deletes one of them before this DELETE runs.
+        ShoppingCart.objects.filter(user=user, recipe=recipes[0]).delete()
+        return delete_returning(model, user, field, values)
+
+    monkeypatch.setattr(bulk, 'delete_returning', single_delete_first)
+    removed = [recipe.pk for recipe in recipes[::2]]
+    results = bulk.remove(ShoppingCart, user, removed)
+    assert results[0] == {'id': recipes[0].pk, 'status': bulk.ABSENT}
+    assert {result['status'] for result in results[1:]} == {bulk.REMOVED}
+    assert set(Recipe.objects.filter(
+        pk__in=removed
+    ).values_list('cart_count', flat=True)) == {0}
+    call_command('rebuild_shopping_lists', '--verify')
+
+
+def test_clear_cart(user, recipes, django_assert_max_num_queries):
+    # Independent of the cart size: no per-row signals.
+    with django_assert_max_num_queries(10):
+        results = bulk.clear_cart(user)
+    assert {result['id'] for result in results} == {
+        recipe.pk for recipe in recipes[::2]
+    }
+    assert not ShoppingCart.objects.filter(user=user).exists()
+    assert not Recipe.objects.filter(cart_count__gt=0).exists()
+    call_command('rebuild_shopping_lists', '--verify')
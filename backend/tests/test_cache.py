@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+from django.db import transaction
+
+from api import user_state
+from api.cache import get_cache, get_version, single_flight
+from recipes import bulk
+from recipes.models import Favorite, Ingredient
+from tags.models import Tag
+
+
+@pytest.mark.parametrize('namespace, create', (
+    ('tags', lambda: Tag.objects.create(
+        name='Тег', color='#000000', slug='tag'
+    )),
+    ('ingredients', lambda: Ingredient.objects.create(
+        name='Соль', measurement_unit='г'
+    )),
+))
+def test_version_bumped_after_commit(transactional_db, namespace, create):
+    version = get_version(namespace)
+    with transaction.atomic():
+        create()
+        # A reader caching now would see the old rows under this version.
+        assert get_version(namespace) == version
+    assert get_version(namespace) != version
+
+
+@pytest.mark.parametrize('meanwhile', (
+    # The winner's result is not cacheable.
+    lambda: None,
+    # The cache is cleared while the winner computes.
+    lambda: get_cache().clear() or 'winner',
+))
+def test_waiters_stop_without_a_value(settings, meanwhile):
+    entered = threading.Event()
+
+    def slow_compute():
+        entered.set()
+        time.sleep(0.1)
+        result = meanwhile()
+        time.sleep(0.2)
+        return result
+
+    winner = threading.Thread(
+        target=single_flight, args=('key', slow_compute, 60)
+    )
+    winner.start()
+    entered.wait()
+    started = time.monotonic()
+    assert single_flight('key', lambda: 'own', 60) == 'own'
+    assert time.monotonic() - started < settings.API_CACHE_LOCK_TIMEOUT / 2
+    winner.join()
+
+
+def test_user_state_loaded_before_commit_not_kept(
+    transactional_db, monkeypatch, user, recipes
+):
+    monkeypatch.setattr('recipes.signals.schedule_variants', lambda _: None)
+    load_state = user_state.load_state
+
+    def commit_meanwhile(user_id):
+        loaded = load_state(user_id)
+        bulk.remove(Favorite, user, [recipes[0].pk])
+        return loaded
+
+    monkeypatch.setattr(user_state, 'load_state', commit_meanwhile)
+    assert recipes[0].pk in user_state.get_user_state(user).favorites
+    monkeypatch.setattr(user_state, 'load_state', load_state)
+    assert recipes[0].pk not in user_state.get_user_state(user).favorites
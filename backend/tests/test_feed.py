@@ -0,0 +1,50 @@
+"""Feeds stay complete when an author crosses the fan-out threshold."""
+import pytest
+
+from recipes import feed as timeline
+from recipes.models import FeedEntry
+from users.models import Following
+
+
+@pytest.fixture(autouse=True)
+def watermarks(settings):
+    settings.FEED_FANOUT_MAX_FOLLOWERS = 3
+    settings.FEED_FANOUT_MIN_FOLLOWERS = 2
+
+
+def feed(user):
+    return timeline.read(user, limit=100)
+
+
+def copies(author):
+    return FeedEntry.objects.filter(author=author).count()
+
+
+def test_watermarks_crossed(make_user, author, recipes):
+    # recipes makes user follow author: one follower, copied into feeds.
+    follower = Following.objects.get(author=author).user
+    latest = [recipe.pk for recipe in reversed(recipes)]
+    assert feed(follower) == latest
+    others = [make_user('second'), make_user('third')]
+    for other in others:
+        Following.objects.create(user=other, author=author)
+    author.refresh_from_db()
+    assert author.feed_pulled
+    assert feed(follower) == feed(others[1]) == latest
+
+    # Copies go only in the background, and not below the high watermark.
+    assert copies(author) == 2 * len(recipes)
+    Following.objects.filter(user=others[1]).delete()
+    Following.objects.create(user=others[1], author=author)
+    assert timeline.settle() == (0, 2 * len(recipes))
+    Following.objects.filter(user=others[1]).delete()
+    assert timeline.settle() == (0, 0)
+    assert copies(author) == 0
+
+    Following.objects.filter(user=others[0]).delete()
+    assert feed(follower) == latest
+    assert timeline.settle() == (1, 0)
+    author.refresh_from_db()
+    assert not author.feed_pulled
+    assert copies(author) == len(recipes)
+    assert feed(follower) == latest
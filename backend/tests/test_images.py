@@ -0,0 +1,51 @@
+"""Uploaded photos are stored without metadata and decoded once."""
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.storage import media_storage
+
+CAMERA_MAKE = 0x010F
+
+
+@pytest.fixture
+def upload():
+    exif = Image.Exif()
+    exif[CAMERA_MAKE] = 'Camera'
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), 'red').save(buffer, 'JPEG', exif=exif)
+    return 'data:image/jpeg;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@pytest.fixture
+def inline_images(settings, tmp_path, monkeypatch):
+    settings.RECIPE_IMAGE_WORKERS = 0
+    settings.MEDIA_ROOT = str(tmp_path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('the upload was decoded again')
+    monkeypatch.setattr(media_storage, 'open', fail)
+
+
+def test_upload_cleaned(
+    transactional_db, inline_images, user_client, tags, ingredients, upload
+):
+    response = user_client.post('/api/recipes/', {
+        'ingredients': [{'id': ingredients[0].id, 'amount': 10}],
+        'tags': [tags[0].id],
+        'image': upload,
+        'name': 'Рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+    }, format='json')
+    assert response.status_code == 201
+    recipe = Recipe.objects.get(pk=response.json()['id'])
+    assert recipe.variants
+    with Image.open(media_storage.path(recipe.image.name)) as stored:
+        assert not stored.getexif()
+        assert stored.size == (64, 48)
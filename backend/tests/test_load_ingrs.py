@@ -0,0 +1,26 @@
+"""load_ingrs loads the ingredient files shipped in data/."""
+import json
+import os
+
+import pytest
+from django.conf import settings
+from django.core.management import call_command
+
+from recipes.models import Ingredient
+
+
+@pytest.mark.parametrize('filename', ('ingredients.json', 'ingredients.csv'))
+def test_shipped_fixture(db, filename):
+    with open(
+        os.path.join(settings.DATA_ROOT, 'ingredients.json'), encoding='utf-8'
+    ) as file:
+        expected = {
+            (item['name'], item['measurement_unit'])
+            for item in json.load(file)
+        }
+    call_command('load_ingrs', filename)
+    assert set(Ingredient.objects.values_list(
+        'name', 'measurement_unit'
+    )) == expected
+    call_command('load_ingrs', filename)
+    assert Ingredient.objects.count() == len(expected)
@@ -0,0 +1,68 @@
+"""The ingredient index follows recipe changes without full rebuilds."""
+import threading
+
+import pytest
+
+from recipes import matching
+from recipes.models import IngredientAmount
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(matching, '_index', None)
+    # Committed recipes would render variants of their missing images.
+    monkeypatch.setattr('recipes.signals.schedule_variants', lambda _: None)
+
+
+@pytest.fixture
+def built_once(monkeypatch):
+    """Build the index, then fail any later full build."""
+    matching.get_index()
+
+    def fail(*args):
+        raise AssertionError('the whole index was rebuilt')
+    monkeypatch.setattr(matching, 'build_index', fail)
+
+
+def matched(ingredient):
+    return {
+        recipe_id
+        for recipe_id, _, _ in matching.get_index().match([ingredient.id])
+    }
+
+
+def test_recipe_change_reloads_its_postings(
+    transactional_db, recipes, ingredients, built_once
+):
+    IngredientAmount.objects.filter(recipe=recipes[0]).delete()
+    IngredientAmount.objects.create(
+        recipe=recipes[0], ingredient=ingredients[4], amount=1
+    )
+    matching.invalidate([recipes[0].pk])
+    assert matched(ingredients[4]) == {recipes[0].pk}
+    assert recipes[0].pk not in matched(ingredients[0])
+    assert matching.get_index().match([ingredients[4].id]) == [
+        (recipes[0].pk, 1, 0)
+    ]
+
+
+def test_deleted_recipe_dropped(
+    transactional_db, recipes, ingredients, built_once
+):
+    recipes[1].delete()
+    assert matched(ingredients[0]) == {
+        recipe.pk for recipe in recipes if recipe is not recipes[1]
+    }
+
+
+def test_full_rebuild_in_background(
+    transactional_db, recipes, ingredients
+):
+    index = matching.get_index()
+    matching.invalidate()
+    assert matching.get_index() is index
+    for thread in threading.enumerate():
+        if thread.name == 'ingredient-index':
+            thread.join()
+    assert matching.get_index() is not index
+    assert matched(ingredients[0]) == {recipe.pk for recipe in recipes}
@@ -0,0 +1,32 @@
+"""Request metrics cover streamed bodies and stay private by default."""
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+def test_streamed_body_queries_counted(user_client, recipes):
+    response = user_client.get(URL)
+    metrics = response.wsgi_request.metrics
+    counted = metrics.queries
+    b''.join(response.streaming_content)
+    assert metrics.queries > counted
+
+
+def test_no_server_timing_by_default(anonymous_client, recipes):
+    response = anonymous_client.get('/api/recipes/')
+    assert 'Server-Timing' not in response
+
+
+def test_streamed_server_timing_marked_partial(
+    user_client, recipes, settings
+):
+    settings.METRICS_SERVER_TIMING = True
+    response = user_client.get(URL)
+    assert 'partial;' in response['Server-Timing']
+    b''.join(response.streaming_content)
+
+
+def test_server_timing_complete(anonymous_client, recipes, settings):
+    settings.METRICS_SERVER_TIMING = True
+    response = anonymous_client.get('/api/recipes/')
+    assert 'queries' in response['Server-Timing']
+    assert 'partial;' not in response['Server-Timing']
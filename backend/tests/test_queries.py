@@ -0,0 +1,139 @@
+"""Query counts of the recipe and subscription endpoints.
+
+The counts must not grow with the number of recipes on a page, so an
+N+1 coming back fails here. Caches are cleared before every test, so
+these are the counts of a cache miss.
+"""
+import pytest
+
+from api.authentication import local_tokens
+from recipes.models import IngredientAmount, Recipe
+from users.models import Following
+
+AUTHORS_COUNT = 4
+
+
+@pytest.fixture
+def followed_authors(make_user, user, recipes, tags, ingredients):
+    """More authors followed by user, each with a few recipes."""
+    authors = []
+    for number in range(AUTHORS_COUNT):
+        author = make_user(f'followed-{number}')
+        for recipe_number in range(3):
+            recipe = Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}-{recipe_number}',
+                text='Описание',
+                cooking_time=5,
+                image=f'recipes/{number}-{recipe_number}.jpg',
+            )
+            recipe.tags.set(tags[:1])
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=ingredients[0], amount=1
+            )
+        Following.objects.create(user=user, author=author)
+        authors.append(author)
+    return authors
+
+
+@pytest.mark.parametrize('url, max_queries', (
+    ('/api/recipes/', 5),
+    # One more query resolves the tag slugs.
+    ('/api/recipes/?tags=tag-0&tags=tag-1', 6),
+    ('/api/recipes/?ordering=popular', 5),
+))
+def test_recipe_list_anonymous(
+    anonymous_client, recipes, django_assert_max_num_queries,
+    url, max_queries,
+):
+    with django_assert_max_num_queries(max_queries):
+        response = anonymous_client.get(url)
+    assert response.status_code == 200
+    assert len(response.data['results']) == 6
+
+
+@pytest.mark.parametrize('url, max_queries', (
+    ('/api/recipes/', 9),
+    ('/api/recipes/?is_favorited=1', 9),
+    ('/api/recipes/?is_in_shopping_cart=1&tags=tag-0', 9),
+))
+def test_recipe_list_authenticated(
+    user_client, recipes, django_assert_max_num_queries,
+    url, max_queries,
+):
+    with django_assert_max_num_queries(max_queries):
+        response = user_client.get(url)
+    assert response.status_code == 200
+    assert response.data['results']
+
+
+def test_recipe_list_flags(user_client, recipes):
+    response = user_client.get('/api/recipes/?is_favorited=1')
+    results = response.data['results']
+    assert {recipe['id'] for recipe in results} == {
+        recipe.id for recipe in recipes[::2][:len(results)]
+    }
+    assert all(
+        recipe['is_favorited'] and recipe['is_in_shopping_cart']
+        and recipe['author']['is_subscribed']
+        for recipe in results
+    )
+
+
+def test_recipe_detail_anonymous(
+    anonymous_client, recipes, django_assert_max_num_queries
+):
+    with django_assert_max_num_queries(4):
+        response = anonymous_client.get(f'/api/recipes/{recipes[0].id}/')
+    assert response.status_code == 200
+    assert len(response.data['ingredients']) == 3
+    assert response.data['is_favorited'] is False
+
+
+def test_recipe_detail_authenticated(
+    user_client, recipes, django_assert_max_num_queries
+):
+    with django_assert_max_num_queries(8):
+        response = user_client.get(f'/api/recipes/{recipes[0].id}/')
+    assert response.status_code == 200
+    assert len(response.data['ingredients']) == 3
+    assert response.data['is_favorited'] is True
+
+
+def test_cached_responses_skip_database(
+    shared_cache, anonymous_client, user_client, recipes,
+    django_assert_num_queries,
+):
+    anonymous_client.get('/api/recipes/')
+    user_client.get('/api/recipes/')
+    with django_assert_num_queries(0):
+        assert anonymous_client.get('/api/recipes/').status_code == 200
+        assert user_client.get('/api/recipes/').status_code == 200
+
+
+def test_subscriptions_anonymous(
+    db, anonymous_client, django_assert_num_queries
+):
+    with django_assert_num_queries(0):
+        response = anonymous_client.get('/api/users/subscriptions/')
+    assert response.status_code == 401
+
+
+@pytest.mark.parametrize('url', (
+    '/api/users/subscriptions/',
+    '/api/users/subscriptions/?recipes_limit=2',
+))
+def test_subscriptions_authenticated(
+    user_client, followed_authors, django_assert_max_num_queries, url
+):
+    with django_assert_max_num_queries(4):
+        response = user_client.get(url)
+    assert response.status_code == 200
+    assert len(response.data['results']) == AUTHORS_COUNT + 1
+    assert all(author['recipes'] for author in response.data['results'])
+
+
+def test_tokens_not_cached_per_process(user_client, recipes):
+    # A logout in another worker would never reach this process.
+    user_client.get('/api/recipes/')
+    assert not local_tokens.entries
@@ -0,0 +1,77 @@
+"""Query plans of the recipe list filters.
+
+Each filter must be answered by its index; a dropped index or a filter
+rewritten into a form the planner cannot match fails here. PostgreSQL
+prefers sequential scans of tables this small, so they are disabled for
+the EXPLAIN.
+"""
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe
+
+# Unique constraints are named indexes on PostgreSQL only; SQLite
+# creates an automatic index for them instead.
+FLAG_INDEXES = {
+    'postgresql': {
+        'is_favorited': 'unique_favorites',
+        'is_in_shopping_cart': 'unique_recipe',
+    },
+    'sqlite': {
+        'is_favorited': 'sqlite_autoindex_recipes_favorite_1',
+        'is_in_shopping_cart': 'sqlite_autoindex_recipes_shoppingcart_1',
+    },
+}
+
+
+def explain(data, user):
+    request = RequestFactory().get('/api/recipes/', data)
+    request.user = user
+    queryset = RecipeFilter(
+        data, queryset=Recipe.objects.all(), request=request
+    ).qs
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+
+@pytest.fixture(autouse=True)
+def supported_database():
+    if connection.vendor not in FLAG_INDEXES:
+        pytest.skip(f'no expected plans for {connection.vendor}')
+
+
+def test_default_ordering(recipes):
+    assert 'recipe_pub_date_id_idx' in explain({}, AnonymousUser())
+
+
+def test_author(recipes, author):
+    plan = explain({'author': author.id}, AnonymousUser())
+    assert 'recipe_author_pub_date_idx' in plan
+
+
+def test_tags(recipes, tags):
+    plan = explain({'tags': [tags[0].slug, tags[1].slug]}, AnonymousUser())
+    assert 'recipe_tags_tag_recipe_idx' in plan
+
+
+def test_popular(recipes):
+    plan = explain({'ordering': 'popular'}, AnonymousUser())
+    assert 'recipe_popular_idx' in plan
+
+
+def test_trending(recipes):
+    plan = explain({'ordering': 'trending'}, AnonymousUser())
+    assert 'recipe_trending_idx' in plan
+
+
+@pytest.mark.parametrize('name', ('is_favorited', 'is_in_shopping_cart'))
+@pytest.mark.parametrize('value', ('1', '0'))
+def test_user_flags(recipes, user, name, value):
+    plan = explain({name: value}, user)
+    assert FLAG_INDEXES[connection.vendor][name] in plan
@@ -0,0 +1,61 @@
+"""The materialized shopping lists follow every way of changing carts."""
+import pytest
+from django.contrib import admin
+from django.core.management import call_command
+
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingListItem
+
+
+@pytest.fixture
+def assert_in_sync():
+    def check():
+        # Raises CommandError on any drift.
+        call_command('rebuild_shopping_lists', '--verify')
+    return check
+
+
+def totals(user):
+    return dict(ShoppingListItem.objects.filter(
+        user=user
+    ).values_list('ingredient_id', 'total_amount'))
+
+
+def test_cart_rows_saved_and_deleted(user, recipes, assert_in_sync):
+    assert totals(user)
+    assert_in_sync()
+    ShoppingCart.objects.create(user=user, recipe=recipes[1])
+    assert_in_sync()
+    ShoppingCart.objects.filter(user=user).delete()
+    assert totals(user) == {}
+    assert_in_sync()
+
+
+def test_recipe_deleted(user, recipes, ingredients, assert_in_sync):
+    before = totals(user)
+    recipes[0].delete()
+    assert totals(user)[ingredients[0].id] == before[ingredients[0].id] - 10
+    assert_in_sync()
+
+
+def test_author_deleted(user, author, recipes, assert_in_sync):
+    author.delete()
+    assert totals(user) == {}
+    assert_in_sync()
+
+
+def test_admin_amount_changes(user, recipes, ingredients, assert_in_sync):
+    model_admin = admin.site._registry[IngredientAmount]
+    amount = recipes[0].amounts.get(ingredient=ingredients[0])
+    amount.amount = 25
+    model_admin.save_model(None, amount, None, True)
+    assert_in_sync()
+    model_admin.save_model(None, IngredientAmount(
+        recipe=recipes[0], ingredient=ingredients[4], amount=3
+    ), None, False)
+    assert_in_sync()
+    model_admin.delete_model(None, amount)
+    assert_in_sync()
+    model_admin.delete_queryset(
+        None, IngredientAmount.objects.filter(recipe=recipes[2])
+    )
+    assert_in_sync()
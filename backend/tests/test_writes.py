@@ -0,0 +1,59 @@
+"""Favorite, cart and subscription removal: status codes and counters."""
+import pytest
+from django.core.management import call_command
+
+from recipes.models import Recipe
+from users.models import CustomUser, Following
+
+ENDPOINTS = ('favorite', 'shopping_cart')
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_remove_recipe(user_client, recipes, endpoint):
+    url = f'/api/recipes/{recipes[0].pk}/{endpoint}/'
+    assert user_client.delete(url).status_code == 204
+    response = user_client.delete(url)
+    assert response.status_code == 400
+    assert set(response.json()) == {'error'}
+    recipe = Recipe.objects.get(pk=recipes[0].pk)
+    assert recipe.favorites_count + recipe.cart_count == 1
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_remove_unknown_recipe(user_client, recipes, endpoint):
+    response = user_client.delete(f'/api/recipes/999999/{endpoint}/')
+    assert response.status_code == 404
+
+
+def test_unsubscribe(user_client, author, recipes):
+    url = f'/api/users/{author.pk}/subscribe/'
+    assert user_client.delete(url).status_code == 204
+    assert not Following.objects.filter(author=author).exists()
+    assert CustomUser.objects.get(pk=author.pk).followers_count == 0
+    assert user_client.delete(url).status_code == 400
+    assert CustomUser.objects.get(pk=author.pk).followers_count == 0
+
+
+@pytest.fixture
+def committed(transactional_db, monkeypatch):
+    """User state is invalidated on commit."""
+    monkeypatch.setattr('recipes.signals.schedule_variants', lambda _: None)
+
+
+def test_removal_keeps_shopping_list_and_flags(
+    committed, user_client, recipes
+):
+    url = f'/api/recipes/{recipes[0].pk}/'
+    assert user_client.get(url).json()['is_in_shopping_cart']
+    assert user_client.delete(f'{url}shopping_cart/').status_code == 204
+    assert not user_client.get(url).json()['is_in_shopping_cart']
+    call_command('rebuild_shopping_lists', '--verify')
+
+
+def test_unsubscribe_flag(committed, user_client, author, recipes):
+    url = f'/api/recipes/{recipes[0].pk}/'
+    assert user_client.get(url).json()['author']['is_subscribed']
+    assert user_client.delete(
+        f'/api/users/{author.pk}/subscribe/'
+    ).status_code == 204
+    assert not user_client.get(url).json()['author']['is_subscribed']
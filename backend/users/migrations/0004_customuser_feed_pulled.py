@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_feed_pulled(apps, schema_editor):
+    # Until now authors were pulled exactly while over the threshold.
+    CustomUser = apps.get_model('users', 'CustomUser')
+    CustomUser.objects.filter(
+        followers_count__gte=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(feed_pulled=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='feed_pulled',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Рецепты подтягиваются в ленты при чтении'),
+        ),
+        migrations.RunPython(fill_feed_pulled, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,27 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 
+from api.fields import ImageVariantsField
 from recipes.models import Recipe
 from users.models import CustomUser
 
 
+def get_recipes_limit(request):
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is None:
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = -1
+    if recipes_limit < 0:
+        raise ValidationError(
+            {'recipes_limit': 'Укажите неотрицательное целое число'}
+        )
+    return recipes_limit
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
 
     class Meta:
@@ -50,6 +67,7 @@ class CustomUserSerializer(UserSerializer):
 
 
 class SimpleRecipeSerializer(serializers.ModelSerializer):
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -57,13 +75,13 @@ class SimpleRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time',
         )
 
 
 class FollowingSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -77,21 +95,25 @@ class FollowingSerializer(CustomUserSerializer):
             'is_subscribed',
             'recipes',
             'recipes_count',
+            'followers_count',
         )
-
-    @staticmethod
-    def get_recipes_count(obj):
-        return obj.recipes.count()
+        read_only_fields = ('recipes_count', 'followers_count')
 
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return SimpleRecipeSerializer(
+                obj.limited_recipes, many=True
+            ).data
         request = self.context.get('request')
         recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
         return SimpleRecipeSerializer(recipes, many=True).data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if not request:
             return False
@@ -0,0 +1,42 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import invalidate_tokens
+from api.cache import bump_version_on_commit
+from api.user_state import invalidate_user_state
+from recipes import feed as timeline
+from users.models import CustomUser, Following
+
+
+@receiver(post_save, sender=Following)
+def following_created(sender, instance, created, **kwargs):
+    if created:
+        timeline.followers_changed(instance.author_id, 1)
+        timeline.follow(instance.user_id, instance.author_id)
+        invalidate_user_state(instance.user_id)
+
+
+def unfollowed(user_id, author_id):
+    timeline.followers_changed(author_id, -1)
+    timeline.unfollow(user_id, author_id)
+    invalidate_user_state(user_id)
+
+
+@receiver(post_delete, sender=Following)
+def following_deleted(sender, instance, **kwargs):
+    unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, **kwargs):
+    invalidate_tokens()
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def user_changed(sender, update_fields=None, **kwargs):
+    # Logging in only stamps last_login, which cached users may lag on.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        invalidate_tokens()
+        # Recipe pages embed their authors.
+        bump_version_on_commit('recipes')
@@ -1,3 +1,7 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Value
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -9,9 +13,16 @@ from rest_framework.permissions import (
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.paginators import CustomPageNumberPaginator
+from api.paginators import CustomPageNumberPaginator, FeedPaginator
+from recipes.bulk import delete_returning
+from recipes.models import Recipe
 from users.models import Following, CustomUser
-from users.serializers import CustomUserSerializer, FollowingSerializer
+from users.signals import unfollowed
+from users.serializers import (
+    CustomUserSerializer,
+    FollowingSerializer,
+    get_recipes_limit,
+)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -41,19 +52,20 @@ class FollowingViewSet(APIView):
                 {'error': 'Нельзя подписываться на себя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        if Following.objects.filter(
-                user=request.user,
-                author_id=user_id,
-        ).exists():
+        # One INSERT: the constraints, not a prior check, reject duplicates.
+        try:
+            with transaction.atomic():
+                Following.objects.create(
+                    user=request.user,
+                    author_id=user_id,
+                )
+        except IntegrityError:
+            get_object_or_404(CustomUser, id=user_id)
             return Response(
                 {'error': 'Вы уже подписаны на этого пользователя'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         author = get_object_or_404(CustomUser, id=user_id)
-        Following.objects.create(
-            user=request.user,
-            author_id=user_id,
-        )
         return Response(
             self.serializer_class(author, context={'request': request}).data,
             status=status.HTTP_201_CREATED
@@ -61,14 +73,13 @@ class FollowingViewSet(APIView):
 
     def delete(self, request, *args, **kwargs):
         user_id = self.kwargs.get('user_id')
+        with transaction.atomic():
+            if delete_returning(
+                Following, request.user, 'author', [user_id]
+            ):
+                unfollowed(request.user.id, user_id)
+                return Response(status=status.HTTP_204_NO_CONTENT)
         get_object_or_404(CustomUser, id=user_id)
-        subscription = Following.objects.filter(
-            user=request.user,
-            author_id=user_id
-        )
-        if subscription:
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'error': 'Вы не подписаны на данного пользователя'},
             status=status.HTTP_400_BAD_REQUEST
@@ -77,8 +88,24 @@ class FollowingViewSet(APIView):
 
 class FollowingListView(ListAPIView):
     permission_classes = [IsAuthenticated]
-    pagination_class = CustomPageNumberPaginator
+    pagination_class = FeedPaginator
     serializer_class = FollowingSerializer
 
     def get_queryset(self):
-        return CustomUser.objects.filter(following__user=self.request.user)
+        return CustomUser.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        )
+
+    def paginate_queryset(self, queryset):
+        recipes_limit = get_recipes_limit(self.request)
+        authors = super().paginate_queryset(queryset)
+        recipes = defaultdict(list)
+        for recipe in Recipe.objects.latest_per_author(
+            [author.id for author in authors], recipes_limit
+        ):
+            recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes[author.id]
+        return authors